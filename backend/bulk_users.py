@@ -0,0 +1,121 @@
+"""
+Parsing and up-front validation for bulk user provisioning (/admin/users/bulk).
+
+Accepts a CSV upload or a JSON array of user objects using the same fields as
+UserCreateRequest. Every row is validated before any account is created, so
+a typo on row 380 doesn't leave a half-provisioned client behind.
+"""
+import csv
+import io
+import re
+import secrets
+from typing import Any
+
+from pydantic import BaseModel, ValidationError
+
+MAX_BULK_ROWS = 1000
+ALLOWED_ROLES = {"user", "admin"}
+MIN_PASSWORD_LENGTH = 8
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Updated on the profile row after the auth user exists (same as create_admin_user)
+PROFILE_FIELDS = ("daily_audit_limit", "company_name", "company_size", "industry", "role")
+
+
+class BulkUserRow(BaseModel):
+    email: str
+    password: str = ""          # blank = generate one and return it in the row result
+    role: str = "user"
+    daily_audit_limit: int = 1
+    full_name: str = ""
+    company_name: str = ""
+    company_size: str = ""
+    industry: str = ""
+
+
+def parse_csv(raw_bytes: bytes) -> list[dict[str, Any]]:
+    text = raw_bytes.decode("utf-8-sig", errors="replace")  # utf-8-sig strips Excel's BOM
+    reader = csv.DictReader(io.StringIO(text))
+    rows = []
+    for record in reader:
+        # Normalise headers ("Full Name" -> "full_name") and drop empty cells so model defaults apply
+        rows.append({
+            (key or "").strip().lower().replace(" ", "_"): value.strip()
+            for key, value in record.items()
+            if key and value is not None and value.strip() != ""
+        })
+    return rows
+
+
+def validate_rows(raw_rows: list[Any]) -> tuple[list[BulkUserRow], list[dict]]:
+    """Return (valid rows, errors). Row numbers in errors are 1-based data rows."""
+    if len(raw_rows) > MAX_BULK_ROWS:
+        return [], [{"row": None, "error": f"Too many rows ({len(raw_rows)}). Maximum is {MAX_BULK_ROWS} per request."}]
+
+    rows: list[BulkUserRow] = []
+    errors: list[dict] = []
+    seen_emails: dict[str, int] = {}
+    for row_num, raw in enumerate(raw_rows, start=1):
+        if not isinstance(raw, dict):
+            errors.append({"row": row_num, "error": "Row must be an object."})
+            continue
+        try:
+            row = BulkUserRow.model_validate(raw)
+        except ValidationError as e:
+            fields = ", ".join(".".join(str(p) for p in err["loc"]) for err in e.errors())
+            errors.append({"row": row_num, "email": raw.get("email"), "error": f"Invalid field(s): {fields}"})
+            continue
+
+        row.email = row.email.strip().lower()
+        # Only normalise fields the upload provided: assignment marks a field as set,
+        # and model_fields_set decides what an existing account's profile update touches
+        if "role" in row.model_fields_set:
+            row.role = row.role.strip().lower()
+        if not _EMAIL_RE.match(row.email):
+            errors.append({"row": row_num, "email": row.email, "error": "Invalid email address."})
+        elif row.email in seen_emails:
+            errors.append({"row": row_num, "email": row.email, "error": f"Duplicate of row {seen_emails[row.email]}."})
+        elif row.role not in ALLOWED_ROLES:
+            errors.append({"row": row_num, "email": row.email, "error": f"Role must be one of: {', '.join(sorted(ALLOWED_ROLES))}."})
+        elif row.password and len(row.password) < MIN_PASSWORD_LENGTH:
+            errors.append({"row": row_num, "email": row.email, "error": f"Password must be at least {MIN_PASSWORD_LENGTH} characters."})
+        elif row.daily_audit_limit < 0:
+            errors.append({"row": row_num, "email": row.email, "error": "daily_audit_limit cannot be negative."})
+        else:
+            seen_emails[row.email] = row_num
+            rows.append(row)
+    return rows, errors
+
+
+def generate_password() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def profile_update(row: BulkUserRow, existing: bool = False) -> dict:
+    """
+    New accounts get every profile field, defaults included. Existing accounts
+    only get the fields the upload actually provided, so a re-run or a partial
+    CSV (e.g. just email,company_name) never resets role or limits to defaults.
+    """
+    return {
+        field: getattr(row, field)
+        for field in PROFILE_FIELDS
+        if not existing or field in row.model_fields_set
+    }
+
+
+def group_by_profile_update(assignments: list[tuple[str, BulkUserRow, bool]]) -> list[tuple[dict, list[str]]]:
+    """
+    Group (user_id, row, existing) assignments by identical profile payload so
+    each group is one `update ... where id in (...)`. A client onboarding usually
+    shares limit/company/role across every row, so this is typically one write.
+    Assignments with nothing to update are dropped.
+    """
+    groups: dict[tuple, tuple[dict, list[str]]] = {}
+    for user_id, row, existing in assignments:
+        payload = profile_update(row, existing)
+        if not payload:
+            continue
+        key = tuple(sorted(payload.items()))
+        groups.setdefault(key, (payload, []))[1].append(user_id)
+    return list(groups.values())
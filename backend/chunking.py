@@ -0,0 +1,23 @@
+"""
+Knowledge-base chunking for /admin/ingest-md.
+
+Kept free of client/env side effects so scripts and benchmarks can import it.
+"""
+
+
+def chunk_markdown(text: str, chunk_size: int = 3000, overlap: int = 300) -> list[str]:
+    """Split into ~500-word chunks (roughly 3000 chars) with overlap, preferring paragraph boundaries."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        # Try to break at a paragraph boundary
+        if end < len(text):
+            last_para = text.rfind('\n\n', start, end)
+            if last_para > start + overlap:
+                end = last_para
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - overlap if end < len(text) else len(text)
+    return chunks
@@ -0,0 +1,93 @@
+"""
+Per-request deadline budget for the audit pipeline.
+
+Vercel kills the function at 60s. A Deadline is created when /audit is
+entered and handed to every stage; each stage asks whether the remaining
+budget covers its expected cost before starting, and blocking SDK calls run
+with a timeout derived from what is left. Optional stages (retrieval) are
+skipped with a recorded reason; required stages (generation) raise
+DeadlineExceeded, which the handler turns into a structured 503 instead of a
+gateway timeout that wastes the Gemini tokens.
+"""
+import os
+import time
+import asyncio
+import httpx
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Total wall-clock budget per audit, leaving headroom under Vercel's 60s limit.
+AUDIT_DEADLINE_SECONDS = float(os.environ.get("AUDIT_DEADLINE_SECONDS", "55"))
+
+# Rough p95 cost of each stage in seconds. Tune from api_logs.response_time_ms.
+STAGE_COSTS = {
+    "extract": float(os.environ.get("STAGE_COST_EXTRACT", "3")),
+    "embed": float(os.environ.get("STAGE_COST_EMBED", "3")),
+    "retrieve": float(os.environ.get("STAGE_COST_RETRIEVE", "2")),
+    "generate": float(os.environ.get("STAGE_COST_GENERATE", "25")),
+    "log": float(os.environ.get("STAGE_COST_LOG", "1")),
+}
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, remaining_s: float, reasons: list[str]):
+        self.stage = stage
+        self.remaining_s = remaining_s
+        self.reasons = list(reasons)
+        super().__init__(f"Deadline exceeded before/during '{stage}' ({remaining_s:.1f}s left)")
+
+    def to_detail(self) -> dict:
+        return {
+            "error": "deadline_exceeded",
+            "stage": self.stage,
+            "remaining_ms": int(max(0.0, self.remaining_s) * 1000),
+            "reasons": self.reasons,
+            "message": "The audit could not finish within the time limit. Please try again, or upload a shorter document.",
+        }
+
+
+class Deadline:
+    def __init__(self, budget_s: float = AUDIT_DEADLINE_SECONDS, started_at: Optional[float] = None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.expires_at = self.started_at + budget_s
+        self.reasons: list[str] = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.perf_counter()
+
+    def cost_of(self, *stages: str) -> float:
+        return sum(STAGE_COSTS[s] for s in stages)
+
+    def can_afford(self, *stages: str) -> bool:
+        """True if the remaining budget covers the expected cost of all given stages."""
+        return self.remaining() >= self.cost_of(*stages)
+
+    def skip(self, stage: str, reason: str):
+        self.reasons.append(f"{stage}: {reason}")
+        print(f"[deadline] skipped {stage}: {reason} ({self.remaining():.1f}s left)")
+
+    def require(self, *stages: str):
+        """Raise DeadlineExceeded if the given stages can't fit in what's left."""
+        if not self.can_afford(*stages):
+            raise DeadlineExceeded(stages[0], self.remaining(), self.reasons)
+
+    def timeout_for(self, *reserve_stages: str) -> float:
+        """Seconds a call may run while still leaving room for `reserve_stages` afterwards."""
+        return max(0.0, self.remaining() - self.cost_of(*reserve_stages))
+
+    async def run(self, stage: str, fn: Callable[[], T], *reserve_stages: str) -> T:
+        """
+        Run a blocking call in a worker thread, abandoning it once its share of
+        the budget is spent. The thread can't be killed, but the request stops
+        waiting and the event loop stays free for other requests meanwhile.
+        Calls given an HTTP timeout from timeout_for() may hit it first; that
+        is the same budget running out, so it raises DeadlineExceeded too.
+        """
+        timeout = self.timeout_for(*reserve_stages)
+        if timeout <= 0:
+            raise DeadlineExceeded(stage, self.remaining(), self.reasons)
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(fn), timeout=timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            raise DeadlineExceeded(stage, self.remaining(), self.reasons)
@@ -0,0 +1,327 @@
+"""
+Document extractor registry.
+
+Uploads are dispatched on their content (magic bytes / container layout),
+not on the filename suffix, so a renamed or extension-less file still works
+and adding a format never touches the /audit handler. Each extractor is a
+generator of TextBlock(heading, text) records in document order; callers
+assemble them once with a single join, which keeps extraction linear in
+document size.
+
+Register a new format with:
+
+    @register_extractor("rtf", "RTF document", sniff=lambda data: data.startswith(b"{\\rtf"))
+    def extract_rtf(file_bytes: bytes) -> Iterator[TextBlock]:
+        ...
+
+Extractors are tried in registration order, so more specific sniffers
+(containers, HTML) must be registered before the plain-text catch-alls.
+"""
+import io
+import re
+import codecs
+import zipfile
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Callable, Iterator, NamedTuple, Optional
+from xml.etree import ElementTree
+
+SNIFF_BYTES = 4096
+
+
+class TextBlock(NamedTuple):
+    heading: Optional[str]
+    text: str
+
+
+@dataclass(frozen=True)
+class Extractor:
+    name: str
+    label: str                               # user-facing, e.g. "Word document"
+    sniff: Callable[[bytes], bool]
+    extract: Callable[[bytes], Iterator[TextBlock]]
+
+
+_EXTRACTORS: list[Extractor] = []
+
+
+def register_extractor(name: str, label: str, sniff: Callable[[bytes], bool]):
+    def decorator(fn: Callable[[bytes], Iterator[TextBlock]]):
+        _EXTRACTORS.append(Extractor(name=name, label=label, sniff=sniff, extract=fn))
+        return fn
+    return decorator
+
+
+def registered_extractors() -> list[Extractor]:
+    return list(_EXTRACTORS)
+
+
+def sniff_extractor(file_bytes: bytes) -> Optional[Extractor]:
+    for extractor in _EXTRACTORS:
+        try:
+            if extractor.sniff(file_bytes):
+                return extractor
+        except Exception:
+            continue
+    return None
+
+
+def assemble_text(blocks: Iterator[TextBlock]) -> str:
+    """Flatten blocks into the single-spaced text the audit pipeline expects, in one pass."""
+    parts = []
+    for heading, text in blocks:
+        if heading:
+            parts.append(heading)
+        if text:
+            parts.append(text)
+    return re.sub(r'\s+', ' ', "\n".join(parts)).strip()
+
+
+def extract_text(extractor: Extractor, file_bytes: bytes) -> str:
+    return assemble_text(extractor.extract(file_bytes))
+
+
+# --- Sniffing helpers ---
+
+def _zip_names(data: bytes) -> set[str]:
+    if not data.startswith(b"PK\x03\x04"):
+        return set()
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return set(zf.namelist())
+
+
+def _is_odt(data: bytes) -> bool:
+    # ODF stores an uncompressed 'mimetype' entry first; its content sits at a fixed offset
+    return data.startswith(b"PK\x03\x04") and b"application/vnd.oasis.opendocument.text" in data[:SNIFF_BYTES]
+
+
+# Containers and media that must never fall through to the text catch-alls, even when
+# their own sniffer failed (e.g. a truncated .docx whose zip directory is missing)
+_BINARY_MAGIC = (
+    b"PK\x03\x04",                  # zip: docx/odt/xlsx
+    b"%PDF-",
+    b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",  # OLE2: legacy .doc/.xls
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8",
+    b"\x1f\x8b", b"7z\xbc\xaf\x27\x1c", b"Rar!",
+)
+# C0 controls other than tab, newline, vertical tab, form feed, carriage return and
+# the DOS end-of-file marker (0x1a), plus DEL: none of these occur in text files
+_BINARY_BYTES_RE = re.compile(rb"[\x00-\x08\x0e-\x19\x1b-\x1f\x7f]")
+
+
+def _looks_binary(head: bytes) -> bool:
+    return head.lstrip().startswith(_BINARY_MAGIC) or _BINARY_BYTES_RE.search(head) is not None
+
+
+def _decode_text(data: bytes) -> Optional[str]:
+    """Decode as UTF-8 text, or None if it looks binary."""
+    if _looks_binary(data[:SNIFF_BYTES]):
+        return None
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None
+
+
+_HTML_START_RE = re.compile(rb'^\s*(?:<!--.*?-->\s*)*<(?:!doctype\s+html|html|head|body)\b', re.IGNORECASE | re.DOTALL)
+_MD_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+
+def _looks_like_markdown(data: bytes) -> bool:
+    head = data[:SNIFF_BYTES * 4]
+    if _looks_binary(head[:SNIFF_BYTES]):
+        return False
+    try:
+        # final=False: the window may end mid-character (e.g. Devanagari); that tail is held back, not an error
+        text = codecs.getincrementaldecoder("utf-8-sig")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return any(_MD_HEADING_RE.match(line) for line in text.splitlines()[:400])
+
+
+# --- Extractors (registration order = sniff priority) ---
+
+@register_extractor("pdf", "PDF", sniff=lambda data: data[:1024].lstrip().startswith(b"%PDF-"))
+def extract_pdf(file_bytes: bytes) -> Iterator[TextBlock]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield TextBlock(None, text)
+
+
+def _docx_heading_style_ids(doc) -> set[str]:
+    """Style ids whose names mark a heading, resolved once per document."""
+    return {
+        style.styleId
+        for style in doc.styles.element.style_lst
+        if (style.name_val or "").startswith("Heading") or style.name_val == "Title"
+    }
+
+
+def _docx_table_rows(tbl) -> Iterator[str]:
+    """Table rows straight from the XML; python-docx's row.cells rebuilds the whole grid per row."""
+    above: dict[int, str] = {}  # grid column -> text a vertically merged cell continues
+    for tr in tbl.tr_lst:
+        cells: list[str] = []
+        for tc in tr.tc_lst:
+            col = len(cells)
+            text = above.get(col, "") if tc.vMerge == "continue" else "\n".join(p.text for p in tc.p_lst).strip()
+            # Horizontally merged cells repeat their text per grid column, as row.cells does
+            for _ in range(tc.grid_span):
+                above[len(cells)] = text
+                cells.append(text)
+        yield " | ".join(cells)
+
+
+@register_extractor("docx", "Word document", sniff=lambda data: "word/document.xml" in _zip_names(data))
+def extract_docx(file_bytes: bytes) -> Iterator[TextBlock]:
+    """Walk the body once so paragraphs and tables keep their document order."""
+    from docx import Document
+
+    doc = Document(io.BytesIO(file_bytes))
+    heading_style_ids = _docx_heading_style_ids(doc)
+    heading: Optional[str] = None
+    parts: list[str] = []
+    for child in doc.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            text = child.text.strip()
+            if not text:
+                continue
+            # Style id from the paragraph's own XML; Paragraph.style resolves the default style by scanning every style
+            p_style = child.pPr.pStyle if child.pPr is not None else None
+            if p_style is not None and p_style.val in heading_style_ids:
+                if heading or parts:
+                    yield TextBlock(heading, "\n".join(parts))
+                heading, parts = text, []
+            else:
+                parts.append(text)
+        elif tag == "tbl":
+            parts.extend(_docx_table_rows(child))
+    if heading or parts:
+        yield TextBlock(heading, "\n".join(parts))
+
+
+_ODF_TEXT_NS = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+_ODF_TABLE_NS = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+_ODF_OFFICE_NS = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+
+
+@register_extractor("odt", "OpenDocument text", sniff=_is_odt)
+def extract_odt(file_bytes: bytes) -> Iterator[TextBlock]:
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf:
+        root = ElementTree.fromstring(zf.read("content.xml"))
+    body = root.find(f"{{{_ODF_OFFICE_NS}}}body/{{{_ODF_OFFICE_NS}}}text")
+    if body is None:
+        return
+    heading: Optional[str] = None
+    parts: list[str] = []
+    for child in body:
+        text = "".join(child.itertext()).strip()
+        if child.tag == f"{{{_ODF_TEXT_NS}}}h":
+            if heading or parts:
+                yield TextBlock(heading, "\n".join(parts))
+            heading, parts = text, []
+        elif child.tag == f"{{{_ODF_TABLE_NS}}}table":
+            for row in child.iter(f"{{{_ODF_TABLE_NS}}}table-row"):
+                cells = ["".join(cell.itertext()).strip() for cell in row.iter(f"{{{_ODF_TABLE_NS}}}table-cell")]
+                parts.append(" | ".join(cells))
+        elif text:
+            parts.append(text)
+    if heading or parts:
+        yield TextBlock(heading, "\n".join(parts))
+
+
+class _HTMLBlockParser(HTMLParser):
+    _HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    _SKIP = {"script", "style", "noscript", "template"}
+    _BREAKS = {"p", "div", "br", "li", "tr", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[TextBlock] = []
+        self._heading: Optional[str] = None
+        self._parts: list[str] = []
+        self._heading_parts: Optional[list[str]] = None
+        self._skip_depth = 0
+
+    def _flush(self):
+        if self._heading or self._parts:
+            self.blocks.append(TextBlock(self._heading, "".join(self._parts).strip()))
+        self._heading, self._parts = None, []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._HEADINGS:
+            self._flush()
+            self._heading_parts = []
+        elif tag in self._BREAKS:
+            self._parts.append("\n")
+        elif tag in ("td", "th"):
+            self._parts.append(" | ")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self._HEADINGS and self._heading_parts is not None:
+            self._heading = "".join(self._heading_parts).strip() or None
+            self._heading_parts = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._heading_parts is not None:
+            self._heading_parts.append(data)
+        else:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+@register_extractor("html", "HTML document", sniff=lambda data: bool(_HTML_START_RE.match(data[:SNIFF_BYTES].lstrip(b"\xef\xbb\xbf"))))
+def extract_html(file_bytes: bytes) -> Iterator[TextBlock]:
+    parser = _HTMLBlockParser()
+    parser.feed(file_bytes.decode("utf-8", errors="replace"))
+    parser.close()
+    yield from parser.blocks
+
+
+@register_extractor("markdown", "Markdown document", sniff=_looks_like_markdown)
+def extract_markdown(file_bytes: bytes) -> Iterator[TextBlock]:
+    heading: Optional[str] = None
+    parts: list[str] = []
+    for line in file_bytes.decode("utf-8-sig", errors="replace").splitlines():
+        match = _MD_HEADING_RE.match(line)
+        if match:
+            if heading or parts:
+                yield TextBlock(heading, "\n".join(parts))
+            heading, parts = match.group(2), []
+        else:
+            parts.append(line)
+    if heading or parts:
+        yield TextBlock(heading, "\n".join(parts))
+
+
+@register_extractor("text", "text file", sniff=lambda data: _decode_text(data) is not None)
+def extract_plain_text(file_bytes: bytes) -> Iterator[TextBlock]:
+    yield TextBlock(None, file_bytes.decode("utf-8-sig", errors="replace"))
+
+
+# --- Format-specific entry points (kept for scripts and benchmarks) ---
+
+def extract_and_clean_text(file_bytes: bytes) -> str:
+    return assemble_text(extract_pdf(file_bytes))
+
+
+def extract_text_from_docx(file_bytes: bytes) -> str:
+    """Extract text from a .docx (Word) file."""
+    try:
+        return assemble_text(extract_docx(file_bytes))
+    except Exception as e:
+        raise ValueError(f"Could not read .docx file: {str(e)}")
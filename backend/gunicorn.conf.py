@@ -0,0 +1,95 @@
+"""
+Gunicorn config for the Cloud Run / Docker production server.
+
+Runs N uvicorn workers behind one gunicorn master. Heavy third-party imports
+happen here, in the master, so every forked worker inherits them already
+loaded (copy-on-write) instead of paying the import cost on cold start.
+The app itself is NOT preloaded: each worker builds its own Supabase/Gemini
+clients after fork, so no HTTP connection pools are shared between processes.
+
+All settings are driven by env vars so the same image can be resized from
+the Cloud Run console without a rebuild. See docs/PRODUCTION_SERVER.md.
+"""
+import os
+import math
+import multiprocessing
+
+# --- Preload heavy imports before fork ---
+# Failures here are non-fatal: the worker will surface the real import error.
+for _module in ("pypdf", "docx", "google.genai", "supabase", "fastapi", "pydantic"):
+    try:
+        __import__(_module)
+    except Exception as _e:
+        print(f"[gunicorn] preload of '{_module}' skipped: {_e}")
+
+# --- Binding ---
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# --- Workers ---
+def _available_cpus() -> int:
+    """
+    CPUs this container may actually use. cpu_count() reports the host's cores;
+    the affinity mask and the cgroup CPU quota (Cloud Run, Docker --cpus) are the real limit.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS dev machines
+        cpus = multiprocessing.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                quota, period = int(f.read()), int(g.read())
+            if quota > 0:
+                cpus = min(cpus, max(1, math.ceil(quota / period)))
+        except (OSError, ValueError):
+            pass
+    return cpus
+
+
+# WEB_CONCURRENCY is the conventional knob (see the sizing guide); default to one worker per available CPU.
+workers = int(os.environ.get("WEB_CONCURRENCY") or _available_cpus())
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# A single audit can take ~30-60s of Gemini time; don't let the arbiter kill it.
+timeout = int(os.environ.get("WORKER_TIMEOUT", "120"))
+keepalive = 5
+
+# --- Graceful draining ---
+# Cloud Run sends SIGTERM and hard-kills 10s later. Gunicorn stops accepting new
+# connections on SIGTERM and gives in-flight requests `graceful_timeout` seconds.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "8"))
+
+# Recycle workers periodically to cap memory growth from large PDFs.
+max_requests = int(os.environ.get("MAX_REQUESTS", "500"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "50"))
+
+# Cloud Run expects logs on stdout/stderr.
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
+
+# --- Shared warm state ---
+# When SHARED_STATE_DIR is set (e.g. /dev/shm/auditai), small read-mostly values are
+# built by the first worker that needs them and written there for the rest to read.
+# Clear any stale snapshots from a previous container run before forking.
+def on_starting(server):
+    shared_dir = os.environ.get("SHARED_STATE_DIR")
+    if not shared_dir:
+        return
+    os.makedirs(shared_dir, exist_ok=True)
+    for name in os.listdir(shared_dir):
+        if name.endswith(".snap") or name.endswith(".lock"):
+            try:
+                os.remove(os.path.join(shared_dir, name))
+            except OSError:
+                pass
+    server.log.info(f"Shared state dir ready: {shared_dir}")
+
+
+def worker_int(worker):
+    worker.log.info(f"Worker {worker.pid} interrupted, draining.")
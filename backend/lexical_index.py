@@ -0,0 +1,224 @@
+"""
+In-process BM25 index over labour_laws.content, partitioned by tool_id.
+
+Embedding search is weak at exact references ("Section 17 gratuity",
+"Chapter IV standing orders"), and it can't start until the embedding call
+returns. This index answers those queries locally in milliseconds and is
+fused with vector hits via reciprocal-rank fusion. When the embedding API is
+slow or down it is the whole retrieval path.
+
+Each tool's partition is loaded lazily from Supabase on first use and kept in
+sync incrementally by /admin/ingest-md and the KB delete endpoint. Other
+workers notice the change through a cheap (row count, max id) signature
+check every LEXICAL_REFRESH_SECONDS and rebuild their partition.
+"""
+import os
+import re
+import math
+import time
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+LEXICAL_REFRESH_SECONDS = float(os.environ.get("LEXICAL_REFRESH_SECONDS", "60"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+PAGE_SIZE = 1000
+
+# References the auditor cites; "Section 17" becomes the single token "section_17"
+_REFERENCE_WORDS = {"section", "sec", "chapter", "rule", "schedule", "clause", "article", "part"}
+_REFERENCE_ALIASES = {"sec": "section"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or shall that the this to was were which with
+any such all may other under been being not no if than then there these those into upon where who whom
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens, minus stopwords, plus compound section/chapter reference tokens."""
+    words = _TOKEN_RE.findall(text.lower())
+    tokens = []
+    for i, word in enumerate(words):
+        if word not in _STOPWORDS:
+            tokens.append(word)
+        if word in _REFERENCE_WORDS and i + 1 < len(words):
+            nxt = words[i + 1]
+            # numbers (17, 2a) or roman numerals (iv, xii)
+            if nxt[0].isdigit() or re.fullmatch(r"[ivxlc]+", nxt):
+                tokens.append(f"{_REFERENCE_ALIASES.get(word, word)}_{nxt}")
+    return tokens
+
+
+class BM25Partition:
+    """BM25 over one tool's chunks. Supports incremental add/remove."""
+
+    def __init__(self):
+        self.docs: dict[int, dict] = {}            # id -> {"content", "filename", "length"}
+        self.postings: dict[str, dict[int, int]] = {}  # term -> {id: term frequency}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    @property
+    def max_id(self) -> int:
+        return max(self.docs) if self.docs else 0
+
+    def add(self, rows: Iterable[dict]):
+        for row in rows:
+            doc_id = row["id"]
+            if doc_id in self.docs:
+                self._remove_doc(doc_id)
+            content = row.get("content") or ""
+            counts = Counter(tokenize(content))
+            length = sum(counts.values())
+            self.docs[doc_id] = {"content": content, "filename": row.get("filename"), "length": length}
+            self.total_length += length
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+
+    def _remove_doc(self, doc_id: int):
+        doc = self.docs.pop(doc_id)
+        self.total_length -= doc["length"]
+        for term, tf in Counter(tokenize(doc["content"])).items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def remove_file(self, filename: str) -> int:
+        doc_ids = [doc_id for doc_id, doc in self.docs.items() if doc["filename"] == filename]
+        for doc_id in doc_ids:
+            self._remove_doc(doc_id)
+        return len(doc_ids)
+
+    def search(self, query: str, k: int) -> list[dict]:
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avgdl = self.total_length / n or 1.0
+        scores: dict[int, float] = {}
+        # Unique query terms only: a long policy repeats common words many times
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                dl = self.docs[doc_id]["length"]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+        top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [
+            {"id": doc_id, "content": self.docs[doc_id]["content"], "filename": self.docs[doc_id]["filename"], "bm25": score}
+            for doc_id, score in top
+        ]
+
+
+class LexicalIndex:
+    def __init__(self, supabase):
+        self._supabase = supabase
+        self._partitions: dict[str, BM25Partition] = {}
+        self._signatures: dict[str, tuple[int, int]] = {}
+        self._checked_at: dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _remote_signature(self, tool_id: str) -> tuple[int, int]:
+        res = self._supabase.table("labour_laws").select("id", count="exact")\
+            .eq("tool_id", tool_id).order("id", desc=True).limit(1).execute()
+        max_id = res.data[0]["id"] if res.data else 0
+        return (res.count or 0, max_id)
+
+    def _load(self, tool_id: str) -> BM25Partition:
+        partition = BM25Partition()
+        offset = 0
+        while True:
+            res = self._supabase.table("labour_laws").select("id, content, filename")\
+                .eq("tool_id", tool_id).order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+            rows = res.data or []
+            partition.add(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        return partition
+
+    def _local_signature(self, tool_id: str) -> tuple[int, int]:
+        partition = self._partitions.get(tool_id)
+        return (len(partition), partition.max_id) if partition else (-1, -1)
+
+    def ensure_fresh(self, tool_id: str) -> BM25Partition:
+        """Load the tool's partition on first use; rebuild it if another worker changed the corpus."""
+        with self._lock:
+            now = time.monotonic()
+            if tool_id in self._partitions and now - self._checked_at.get(tool_id, 0) < LEXICAL_REFRESH_SECONDS:
+                return self._partitions[tool_id]
+            self._checked_at[tool_id] = now
+            signature = self._remote_signature(tool_id)
+            if signature != self._local_signature(tool_id):
+                t0 = time.perf_counter()
+                self._partitions[tool_id] = self._load(tool_id)
+                print(f"BM25 index for '{tool_id}' rebuilt: {len(self._partitions[tool_id])} chunks in {int((time.perf_counter() - t0) * 1000)}ms")
+            return self._partitions[tool_id]
+
+    def search(self, tool_id: str, query: str, k: int) -> list[dict]:
+        return self.ensure_fresh(tool_id).search(query, k)
+
+    def search_loaded(self, tool_id: str, query: str, k: int) -> list[dict]:
+        """
+        Search only what is already in memory; safe to call on the event loop.
+        Returns [] if the partition isn't loaded or another thread holds the lock
+        (e.g. a load that outlived its deadline) instead of waiting or loading.
+        """
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            partition = self._partitions.get(tool_id)
+            return partition.search(query, k) if partition is not None else []
+        finally:
+            self._lock.release()
+
+    def add_rows(self, tool_id: str, rows: list[dict]):
+        """
+        Apply freshly inserted labour_laws rows (must include id, content, filename).
+        Blocks on the index lock: call it (and remove_file) from a worker thread.
+        """
+        with self._lock:
+            partition = self._partitions.get(tool_id)
+            if partition is not None:
+                partition.add(rows)
+
+    def remove_file(self, tool_id: str, filename: str):
+        with self._lock:
+            partition = self._partitions.get(tool_id)
+            if partition is not None:
+                partition.remove_file(filename)
+
+    def kb_version(self, tool_id: str) -> Optional[str]:
+        """
+        Identifies the current corpus for a tool; changes whenever chunks are added or removed.
+        Like search_loaded, never waits: returns None while another thread holds the lock.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if tool_id not in self._partitions:
+                return None
+            count, max_id = self._local_signature(tool_id)
+            return f"{count}:{max_id}"
+        finally:
+            self._lock.release()
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int, rrf_k: int = RRF_K) -> list[dict]:
+    """Merge ranked hit lists by sum of 1/(rrf_k + rank). Hits are matched on 'id'."""
+    scores: dict = {}
+    hits: dict = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            hit_id = hit.get("id")
+            scores[hit_id] = scores.get(hit_id, 0.0) + 1.0 / (rrf_k + rank)
+            hits.setdefault(hit_id, hit)
+    fused = sorted(scores, key=lambda hit_id: (-scores[hit_id], str(hit_id)))[:k]
+    return [dict(hits[hit_id], rrf_score=scores[hit_id]) for hit_id in fused]
@@ -1,21 +1,29 @@
 import os
-import io
 import re
 import json
 import time
 import hashlib
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, Form, Request, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, Form, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import traceback
-from pypdf import PdfReader
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types as genai_types
 from pydantic import BaseModel
 from supabase import create_client, Client
+from tool_registry import ToolRegistry
+from preflight import run_preflight
+from deadline import Deadline, DeadlineExceeded
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from bulk_users import BulkUserRow, parse_csv, validate_rows, generate_password, group_by_profile_update
+from extractors import sniff_extractor, extract_text, registered_extractors
+from chunking import chunk_markdown
+from policy_sections import split_sections, format_sections_for_prompt, parse_section_results, merge_section_results, expire_section_findings
+from usage_rollups import GRANULARITIES, MAX_RANGE_DAYS, fetch_rollups, summarize, record_cache_hit
 
 # Load environment variables
 load_dotenv()
@@ -37,6 +45,22 @@ gemini = genai.Client(api_key=GEMINI_API_KEY)
 # Primary model: Gemini 2.5 Flash (latest GA free tier)
 PRIMARY_MODEL = "gemini-2.5-flash"
 
+# Per-tool prompts and retrieval settings, compiled from tool_runtime_config at startup
+# and re-checked in the background
+tool_registry = ToolRegistry(supabase, default_model=PRIMARY_MODEL)
+tool_registry.refresh()
+tool_registry.start_refresher()
+
+# Section findings older than this are re-audited (matches the 7-day audit log retention)
+SECTION_CACHE_DAYS = int(os.environ.get("SECTION_CACHE_DAYS", "7"))
+
+# Bulk user provisioning: concurrent auth.admin.create_user calls, rows per streamed wave
+BULK_PROVISION_CONCURRENCY = int(os.environ.get("BULK_PROVISION_CONCURRENCY", "8"))
+BULK_PROVISION_WAVE = 50
+
+# BM25 index over labour_laws, loaded per tool on first use and kept in sync by the KB endpoints
+lexical_index = LexicalIndex(supabase)
+
 app = FastAPI(title="Labour Code Auditor API")
 
 # Configure CORS - allow localhost for dev and specific Vercel deployment for prod
@@ -69,6 +93,10 @@ class AuditResponse(BaseModel):
     model_id: str
     provider: str
     response_time_ms: int
+    degraded: bool = False
+    degraded_reasons: list[str] = []
+    sections_total: int = 0
+    sections_reused: int = 0
 
 class UserCreateRequest(BaseModel):
     email: str
@@ -83,43 +111,12 @@ class UserCreateRequest(BaseModel):
 class PasswordUpdateRequest(BaseModel):
     new_password: str
 
-def extract_and_clean_text(file_bytes: bytes) -> str:
-    reader = PdfReader(io.BytesIO(file_bytes))
-    full_text = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            full_text.append(text)
-    
-    raw_text = "\n".join(full_text)
-    clean_text = re.sub(r'\s+', ' ', raw_text).strip()
-    return clean_text
-
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    """Extract text from a .docx (Word) file."""
-    from docx import Document
-
-    try:
-        doc = Document(io.BytesIO(file_bytes))
-        paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-        full_text = "\n".join(paragraphs)
-
-        # Also extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = [cell.text.strip() for cell in row.cells]
-                full_text += "\n" + " | ".join(row_text)
-
-        clean_text = re.sub(r'\s+', ' ', full_text).strip()
-        return clean_text
-    except Exception as e:
-        raise ValueError(f"Could not read .docx file: {str(e)}")
-
-def generate_embedding(text: str) -> list[float]:
+def generate_embedding(text: str, timeout_s: Optional[float] = None) -> list[float]:
+    http_options = genai_types.HttpOptions(timeout=int(timeout_s * 1000)) if timeout_s else None
     result = gemini.models.embed_content(
         model="gemini-embedding-001",
         contents=text,
-        config=genai_types.EmbedContentConfig(output_dimensionality=768)
+        config=genai_types.EmbedContentConfig(output_dimensionality=768, http_options=http_options)
     )
     return list(result.embeddings[0].values)
 
@@ -141,178 +138,242 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
 @app.get("/audit/status")
 async def audit_status(user = Depends(get_current_user)):
     """Returns today's usage count and daily limit for the current user."""
-    profile_res = supabase.table("profiles").select("daily_audit_limit, role").eq("id", user.id).execute()
-    if not profile_res.data:
+    preflight = run_preflight(supabase, user.id)
+    if not preflight.found:
         raise HTTPException(status_code=403, detail="Account not found.")
-    profile = profile_res.data[0]
-    is_admin = profile.get("role") == "admin"
-    daily_limit = profile.get("daily_audit_limit", 3)
-    today_str = datetime.utcnow().date().isoformat()
-    logs_res = supabase.table("api_logs").select("id").eq("user_id", user.id).gte("created_at", today_str).execute()
-    usage_count = len(logs_res.data) if logs_res.data else 0
     return {
-        "usage_today": usage_count,
-        "daily_limit": daily_limit,
-        "remaining": max(0, daily_limit - usage_count) if not is_admin else 999,
-        "is_admin": is_admin
+        "usage_today": preflight.usage_today,
+        "daily_limit": preflight.daily_limit,
+        "remaining": preflight.remaining,
+        "is_admin": preflight.is_admin
     }
 
 @app.post("/audit", response_model=AuditResponse)
 async def audit_policy(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     model_id: Optional[str] = Form("gemini-1.5-flash"),
     tool_id: str = Form("labour-audit"),
     user = Depends(get_current_user)
 ):
     start_time = time.perf_counter()
-    # 1. GATEKEEPER CHECK: Ensure user is not locked and hasn't exceeded limits
-    profile_res = supabase.table("profiles").select("*").eq("id", user.id).execute()
-    if not profile_res.data:
+    # Every stage below checks this budget before starting (see deadline.py)
+    deadline = Deadline(started_at=start_time)
+    # 0. Resolve the tool before any network or model work
+    tool = tool_registry.get(tool_id)
+    if tool is None:
+        raise HTTPException(status_code=400, detail=f"Unknown tool '{tool_id}'.")
+
+    # Read and hash the upload first so the cache lookup can ride along with the preflight
+    file_bytes = await file.read()
+    if len(file_bytes) > 20 * 1024 * 1024:  # 20MB guard
+        raise HTTPException(status_code=400, detail="File too large. Maximum file size is 20MB.")
+
+    # Dispatch on the file's content, not its name (see extractors.py)
+    extractor = sniff_extractor(file_bytes)
+    if extractor is None:
+        supported = ", ".join(e.label for e in registered_extractors())
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Supported formats: {supported}.")
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+
+    # 1. GATEKEEPER CHECK: lock/delete state, quota and hash cache in a single round trip
+    preflight = run_preflight(supabase, user.id, file_hash, tool.tool_id)
+    if not preflight.found:
         raise HTTPException(status_code=403, detail="Account not found. Contact Administrator.")
 
-    profile = profile_res.data[0]
-    is_admin = profile.get("role") == "admin"
-
-    if profile.get("is_locked"):
+    if preflight.is_locked:
         raise HTTPException(status_code=403, detail="Account Locked. Contact Administrator.")
 
-    if profile.get("is_deleted"):
+    if preflight.is_deleted:
         raise HTTPException(status_code=403, detail="Account not found. Contact Administrator.")
 
     # Admins are exempt from daily rate limits
-    if not is_admin:
-        today_str = datetime.utcnow().date().isoformat()
-        logs_res = supabase.table("api_logs").select("id").eq("user_id", user.id).gte("created_at", today_str).execute()
-        usage_count = len(logs_res.data) if logs_res.data else 0
-        daily_limit = profile.get("daily_audit_limit", 3)
-        if usage_count >= daily_limit:
-            raise HTTPException(
-                status_code=403,
-                detail=f"Daily audit limit reached ({usage_count}/{daily_limit}). Contact your administrator to increase your quota."
-            )
+    if not preflight.is_admin and preflight.usage_today >= preflight.daily_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Daily audit limit reached ({preflight.usage_today}/{preflight.daily_limit}). Contact your administrator to increase your quota."
+        )
 
-    file_ext = file.filename.lower()
-    if not (file_ext.endswith('.pdf') or file_ext.endswith('.docx')):
-        raise HTTPException(status_code=400, detail="Only PDF and Word (.docx) files are supported. Please upload a .pdf or .docx file.")
+    # File Hash Caching Check to prevent redundant API calls
+    if preflight.cached:
+        cached = preflight.cached
+        # Cache hits write no api_logs row (they don't use quota), so count them in the rollups directly
+        background_tasks.add_task(record_cache_hit, supabase, user.id, tool.tool_id, cached.get("model_id") or tool.model_id)
+        # Provide the cached analysis skipping AI model load entirely
+        return AuditResponse(
+            compliance_score=cached.get("compliance_score", 50),
+            findings=cached.get("findings", []),
+            model_id=f"cached-{cached.get('model_id', 'unknown')}",
+            provider="cache",
+            response_time_ms=0
+        )
 
     try:
-        # 1. Convert Document to text (PDF or DOCX)
-        file_bytes = await file.read()
-        if len(file_bytes) > 20 * 1024 * 1024:  # 20MB guard
-            raise HTTPException(status_code=400, detail="File too large. Maximum file size is 20MB.")
-            
-        # File Hash Caching Check to prevent redundant API calls
-        file_hash = hashlib.sha256(file_bytes).hexdigest()
-        cached_log_res = supabase.table("api_logs").select("*").eq("user_id", user.id).eq("filename", file_hash).order("created_at", desc=True).limit(1).execute()
-        if cached_log_res.data:
-            cached = cached_log_res.data[0]
-            # Provide the cached analysis skipping AI model load entirely
-            return AuditResponse(
-                compliance_score=cached.get("compliance_score", 50),
-                findings=cached.get("findings", []),
-                model_id=f"cached-{cached.get('model_id', 'unknown')}",
-                provider="cache",
-                response_time_ms=0
-            )
-
+        # 1. Convert Document to text — only worth starting if generation still fits afterwards
+        deadline.require("extract", "generate", "log")
         try:
-            if file.filename.lower().endswith('.pdf'):
-                policy_text = extract_and_clean_text(file_bytes)
-            elif file.filename.lower().endswith('.docx'):
-                policy_text = extract_text_from_docx(file_bytes)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a .pdf or .docx file.")
-        except HTTPException:
+            policy_text = await deadline.run("extract", lambda: extract_text(extractor, file_bytes), "generate", "log")
+        except DeadlineExceeded:
             raise
         except Exception as doc_err:
-            print(f"Document extraction error: {doc_err}")
-            file_type = "Word document" if file.filename.lower().endswith('.docx') else "PDF"
-            raise HTTPException(status_code=400, detail=f"Could not read the {file_type}. The file may be corrupted or invalid. Please try another file.")
+            print(f"Document extraction error ({extractor.name}): {doc_err}")
+            raise HTTPException(status_code=400, detail=f"Could not read the {extractor.label}. The file may be corrupted or invalid. Please try another file.")
 
         if not policy_text or len(policy_text.strip()) < 50:
-            raise HTTPException(status_code=400, detail="Could not extract sufficient text from the PDF. It may be a scanned/image-based document. Please use a text-based PDF.")
-
-        # 2. Generate Embedding — truncate to ~8000 chars (covers most policies without hitting limits)
-        truncated_text = policy_text[:8000]
-        query_embedding = generate_embedding(truncated_text)
+            raise HTTPException(status_code=400, detail=f"Could not extract sufficient text from the {extractor.label}. It may be a scanned/image-based document. Please use a text-based file.")
+
+        # 2. Split into content-hashed sections and reuse cached findings for every unchanged one.
+        # Cache entries are keyed on the tool's prompt version and its KB corpus version, which
+        # comes from the lexical index (loaded here so retrieval below is local).
+        sections = split_sections(policy_text)
+        section_results: dict[str, dict] = {}
+        kb_version = None
+        try:
+            await deadline.run("lexical", lambda: lexical_index.ensure_fresh(tool.tool_id), "generate", "log")
+            corpus_version = lexical_index.kb_version(tool.tool_id)
+            kb_version = f"{tool.version}:{corpus_version}" if corpus_version else None
+        except DeadlineExceeded:
+            deadline.skip("lexical", "index load timed out")
+        except Exception as lex_err:
+            print(f"Lexical index unavailable: {lex_err}")
+
+        if kb_version and sections:
+            try:
+                cache_cutoff = (datetime.utcnow() - timedelta(days=SECTION_CACHE_DAYS)).isoformat()
+                cached_sections = await deadline.run("section-cache", lambda: supabase.table("policy_section_findings")
+                    .select("section_hash, compliance_score, findings")
+                    .in_("section_hash", list({sec.hash for sec in sections}))
+                    .eq("tool_id", tool.tool_id)
+                    .eq("kb_version", kb_version)
+                    .gte("created_at", cache_cutoff)
+                    .execute(), "generate", "log")
+                for row in cached_sections.data or []:
+                    section_results[row["section_hash"]] = {
+                        "compliance_score": row.get("compliance_score", 50),
+                        "findings": row.get("findings") or []
+                    }
+            except DeadlineExceeded:
+                deadline.skip("section-cache", "lookup timed out, re-auditing all sections")
+            except Exception as cache_err:
+                print(f"Section cache unavailable: {cache_err}. Re-auditing all sections.")
+
+        changed_sections = [sec for sec in sections if sec.hash not in section_results]
+        sections_reused = len(sections) - len(changed_sections)
+
+        # Every section unchanged (e.g. whitespace-only or out-of-window edits): no model call needed
+        if sections and not changed_sections:
+            comp_score, findings = merge_section_results(sections, section_results)
+            background_tasks.add_task(record_cache_hit, supabase, user.id, tool.tool_id, tool.model_id)
+            return AuditResponse(
+                compliance_score=comp_score,
+                findings=findings,
+                model_id=f"cached-{tool.model_id}",
+                provider="cache",
+                response_time_ms=int((time.perf_counter() - start_time) * 1000),
+                degraded=bool(deadline.reasons),
+                degraded_reasons=deadline.reasons,
+                sections_total=len(sections),
+                sections_reused=sections_reused
+            )
 
-        # 3. Vector Similarity Search — fault-tolerant; falls back to general review if RPC unavailable
+        # 3. Lexical (BM25) retrieval over the changed sections only — local and embedding-free,
+        # so it runs first and always catches exact references like "Section 17".
+        truncated_text = " ".join(sec.text for sec in changed_sections)[:8000]
         legal_context = ""
+        lexical_hits, vector_hits = [], []
         try:
-            similar_docs = supabase.rpc(
-                "match_labour_laws",
-                {
-                    "query_embedding": query_embedding,
-                    "match_threshold": 0.5,
-                    "match_count": 3,  # Reduced from 6 — each chunk is ~3000 chars; 3 = ~9000 chars total
-                    "p_tool_id": tool_id
-                }
-            ).execute()
-            
-            # Sort results deterministically by ID to ensure consistent ordering
-            if similar_docs.data:
-                similar_docs.data = sorted(similar_docs.data, key=lambda x: str(x.get('id', '')))
-                
-            # Truncate each chunk to 800 chars to cap context tokens
-            context_texts = [doc['content'][:800] for doc in similar_docs.data] if similar_docs.data else []
-            legal_context = "\n\n---\n\n".join(context_texts)
-        except Exception as rpc_err:
-            print(f"Vector search unavailable (RPC error): {rpc_err}. Proceeding with general review.")
+            # Never loads or waits: the load above already ran under the deadline
+            lexical_hits = lexical_index.search_loaded(tool.tool_id, truncated_text, tool.match_count * 2)
+        except Exception as lex_err:
+            print(f"Lexical search unavailable: {lex_err}")
+
+        # 4. Generate Embedding — truncate to ~8000 chars (covers most policies without hitting limits)
+        # Vector retrieval is optional: skip it if it would eat into generation's budget.
+        query_embedding = None
+        if not deadline.can_afford("embed", "retrieve", "generate", "log"):
+            deadline.skip("retrieval", "insufficient time budget, using lexical retrieval only")
+        else:
+            try:
+                embed_timeout = deadline.timeout_for("retrieve", "generate", "log")
+                query_embedding = await deadline.run(
+                    "embed", lambda: generate_embedding(truncated_text, timeout_s=embed_timeout), "retrieve", "generate", "log"
+                )
+            except DeadlineExceeded:
+                deadline.skip("retrieval", "embedding timed out, using lexical retrieval only")
+            except Exception as embed_err:
+                print(f"Embedding error: {embed_err}")
+                deadline.skip("retrieval", "embedding unavailable, using lexical retrieval only")
+
+        # 5. Vector Similarity Search — fault-tolerant; falls back to lexical hits if RPC unavailable
+        if query_embedding is not None:
+            try:
+                similar_docs = await deadline.run("retrieve", lambda: supabase.rpc(
+                    "match_labour_laws",
+                    {
+                        "query_embedding": query_embedding,
+                        "match_threshold": tool.match_threshold,
+                        "match_count": tool.match_count * 2,  # over-fetch for fusion; trimmed to match_count below
+                        "p_tool_id": tool.tool_id,
+                        "p_ef_search": tool.ef_search
+                    }
+                ).execute(), "generate", "log")
+                vector_hits = similar_docs.data or []
+            except DeadlineExceeded:
+                deadline.skip("retrieval", "vector search timed out, using lexical retrieval only")
+            except Exception as rpc_err:
+                print(f"Vector search unavailable (RPC error): {rpc_err}. Proceeding with lexical hits.")
+
+        # Reciprocal-rank fusion of vector + lexical hits (default 3 — each chunk is ~3000 chars; 3 = ~9000 chars total)
+        context_docs = reciprocal_rank_fusion([vector_hits, lexical_hits], k=tool.match_count)
+
+        # Sort results deterministically by ID to ensure consistent ordering
+        context_docs = sorted(context_docs, key=lambda x: str(x.get('id', '')))
+
+        # Truncate each chunk (800 chars by default) to cap context tokens
+        context_texts = [doc['content'][:tool.context_chars] for doc in context_docs]
+        legal_context = "\n\n---\n\n".join(context_texts)
 
         if not legal_context:
             legal_context = "No specific legal context found in the knowledge base. Apply your expertise on the 4 Indian Labour Codes: Code on Wages 2019, Industrial Relations Code 2020, Code on Social Security 2020, and Occupational Safety Health and Working Conditions Code 2020."
 
-        # 4. Generate Analysis with Selected Model
-        system_instructions_map = {
-            "labour-audit": """You are an expert Indian Labour Law Compliance Auditor specializing in the 4 new Labour Codes enacted in 2019-2020 (in effect from 2025):
-1. Code on Wages, 2019
-2. Industrial Relations Code, 2020
-3. Code on Social Security, 2020
-4. Occupational Safety, Health and Working Conditions Code, 2020
-
-Review the provided Employee Policy and identify specific compliance gaps or satisfied requirements. Be precise — cite specific sections/chapters of the codes.""",
-            "wage-compliance": """You are an expert Indian Wage Compliance Auditor. Review the policy specifically for the Code on Wages 2019. Identify gaps in minimum wages, payment terms, deductions, or bonuses. Cite specific sections.""",
-            "social-security": """You are an expert Indian Social Security Compliance Auditor. Review the policy for the Code on Social Security 2020. Identify gaps in provident fund, gratuity, ESI, maternity benefits, or compensation. Cite specific sections.""",
-            "workplace-safety": """You are an expert Indian Workplace Safety Auditor. Review the policy for the Occupational Safety, Health and Working Conditions Code 2020. Identify gaps in workplace safety standard, working hours, and conditions. Cite specific sections.""",
-            "ir-compliance": """You are an expert Indian Industrial Relations Auditor. Review the policy for the Industrial Relations Code 2020. Identify gaps in dispute resolution, collective bargaining, strikes, or worker committees. Cite specific sections."""
-        }
-        
-        system_instructions = system_instructions_map.get(
-            tool_id,
-            system_instructions_map["labour-audit"]
-        )
+        # 6. Generate Analysis of the changed sections with the tool's configured model
+        system_instructions = tool.system_prompt
 
         prompt = f"""
 LEGAL CONTEXT (Relevant Sections of Indian Labour Codes):
 {legal_context}
 
-EMPLOYEE POLICY TO AUDIT:
-{policy_text[:6000]}
+EMPLOYEE POLICY SECTIONS TO AUDIT (each labelled [S<n>]):
+{format_sections_for_prompt(changed_sections)}
 
-Analyze the policy for compliance with the Indian Labour Codes above. Identify specific gaps, violations, or well-compliant clauses. Cite the relevant Code and section for each finding.
+Analyze each policy section for compliance with the Indian Labour Codes above. Identify specific gaps, violations, or well-compliant clauses. Cite the relevant Code and section for each finding. Give 1-3 findings per section.
 
-Return ONLY a raw JSON object (no markdown, no code fences) in this exact schema:
+Return ONLY a raw JSON object (no markdown, no code fences) in this exact schema, with one entry per section label:
 {{
-    "compliance_score": <integer 0-100, where 100=fully compliant, 0=critically non-compliant>,
-    "findings": [
-        "<Finding 1: specific issue or compliance with law section reference>",
-        "<Finding 2>",
-        "<Finding 3>",
-        "<Finding 4>",
-        "<Finding 5>"
+    "sections": [
+        {{
+            "section_id": "<S1, S2, ... exactly as labelled above>",
+            "compliance_score": <integer 0-100, where 100=fully compliant, 0=critically non-compliant>,
+            "findings": [
+                "<Finding 1: specific issue or compliance with law section reference>",
+                "<Finding 2>"
+            ]
+        }}
     ]
 }}
 """
         final_provider = "google"
-        final_model = PRIMARY_MODEL
+        final_model = tool.model_id
         findings = []
         comp_score = 50
         p_tokens, c_tokens, t_tokens = 0, 0, 0
 
-        # Gemini 2.5 Flash — primary model, with automatic fallback to 1.5 Flash
+        # Gemini 2.5 Flash — primary model. Abandoned (not billed further) if it would overrun the deadline.
+        deadline.require("generate")
+        generate_timeout_ms = int(deadline.timeout_for("log") * 1000)
         try:
-            response = gemini.models.generate_content(
-                model=PRIMARY_MODEL,
+            response = await deadline.run("generate", lambda: gemini.models.generate_content(
+                model=final_model,
                 contents=system_instructions + "\n\n" + prompt,
                 config=genai_types.GenerateContentConfig(
                     temperature=0.0,
@@ -320,13 +381,16 @@ Return ONLY a raw JSON object (no markdown, no code fences) in this exact schema
                     top_k=40,
                     seed=42,
                     response_mime_type="application/json",
+                    http_options=genai_types.HttpOptions(timeout=generate_timeout_ms),
                 )
-            )
+            ), "log")
             response_text = response.text
             if response.usage_metadata:
                 p_tokens = response.usage_metadata.prompt_token_count or 0
                 c_tokens = response.usage_metadata.candidates_token_count or 0
                 t_tokens = response.usage_metadata.total_token_count or 0
+        except DeadlineExceeded:
+            raise
         except Exception as ai_err:
             err_str = str(ai_err)
             print(f"Gemini 2.5 Flash error: {ai_err}")
@@ -349,25 +413,69 @@ Return ONLY a raw JSON object (no markdown, no code fences) in this exact schema
             response_text = response_text[7:-3].strip()
         elif response_text.startswith("```"):
             response_text = response_text[3:-3].strip()
-            
-        try:
-            parsed_response = json.loads(response_text)
-            comp_score = parsed_response.get("compliance_score", 50)
-            findings = parsed_response.get("findings", [])
-        except json.JSONDecodeError:
-            comp_score = 50
-            findings = ["Failed to parse AI response.", response_text[:200]]
+
+        # An incomplete or wrongly shaped reply is not an audit: never merge or cache it. The tokens
+        # were still spent, so log the usage with no score — it counts against the daily quota and
+        # in the rollups, and audit_preflight never serves a score-less row from the file cache.
+        new_results = parse_section_results(response_text, changed_sections)
+        if new_results is None:
+            print(f"Unusable AI response for {len(changed_sections)} section(s): {response_text[:200]}")
+            try:
+                supabase.table("api_logs").insert({
+                    "endpoint": "/audit",
+                    "prompt_tokens": p_tokens,
+                    "completion_tokens": c_tokens,
+                    "total_tokens": t_tokens,
+                    "filename": file_hash,
+                    "tool_id": tool.tool_id,
+                    "compliance_score": None,
+                    "user_id": user.id,
+                    "findings": [],
+                    "model_id": final_model,
+                    "provider": final_provider,
+                    "response_time_ms": int((time.perf_counter() - start_time) * 1000)
+                }).execute()
+            except Exception as log_err:
+                print(f"Failed to log usage of unusable AI response: {log_err}")
+            raise HTTPException(
+                status_code=502,
+                detail="The AI Auditor returned an incomplete analysis. Nothing was saved; please try again."
+            )
+
+        section_results.update(new_results)
+        comp_score, findings = merge_section_results(sections, section_results)
+
+        # Cache the fresh section findings for the next revision (best-effort)
+        if kb_version and new_results:
+            try:
+                supabase.table("policy_section_findings").upsert([
+                    {
+                        "section_hash": section_hash,
+                        "tool_id": tool.tool_id,
+                        "kb_version": kb_version,
+                        "compliance_score": result["compliance_score"],
+                        "findings": result["findings"],
+                        "model_id": final_model,
+                        # Re-audits of an expired entry must restart its window, not keep the old one
+                        "created_at": datetime.utcnow().isoformat()
+                    }
+                    for section_hash, result in new_results.items()
+                ]).execute()
+                background_tasks.add_task(expire_section_findings, supabase, SECTION_CACHE_DAYS)
+            except Exception as cache_err:
+                print(f"Failed to cache section findings: {cache_err}")
 
         end_time = time.perf_counter()
         resp_time_ms = int((end_time - start_time) * 1000)
 
-        # 5. Save usage metadata to API logs
+        # 7. Save usage metadata to API logs
         supabase.table("api_logs").insert({
             "endpoint": "/audit",
             "prompt_tokens": p_tokens,
             "completion_tokens": c_tokens,
             "total_tokens": t_tokens,
             "filename": file_hash,
+            "tool_id": tool.tool_id,
             "compliance_score": comp_score,
             "user_id": user.id,
             "findings": findings,
@@ -381,30 +489,73 @@ Return ONLY a raw JSON object (no markdown, no code fences) in this exact schema
             findings=findings,
             model_id=final_model,
             provider=final_provider,
-            response_time_ms=resp_time_ms
+            response_time_ms=resp_time_ms,
+            degraded=bool(deadline.reasons),
+            degraded_reasons=deadline.reasons,
+            sections_total=len(sections),
+            sections_reused=sections_reused
         )
-        
+
+    except DeadlineExceeded as e:
+        print(f"Audit deadline exceeded: {e}. Reasons: {e.reasons}")
+        raise HTTPException(status_code=503, detail=e.to_detail())
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Audit error: {e}")
         raise HTTPException(status_code=500, detail="An internal server error occurred during the audit process.")
 
 @app.get("/logs")
-async def get_logs(user = Depends(get_current_user)):
+async def get_logs(limit: int = Query(200, ge=1, le=1000), user = Depends(get_current_user)):
     try:
         # Admins see all logs, regular users see only theirs
         profile_res = supabase.table("profiles").select("role").eq("id", user.id).execute()
         is_admin = profile_res.data and profile_res.data[0].get("role") == "admin"
         
-        query = supabase.table("api_logs").select("*").order("created_at", desc=False)
+        # Most recent `limit` rows, returned oldest first; totals and trends come from /usage/summary
+        query = supabase.table("api_logs").select("*").order("created_at", desc=True).limit(limit)
         if not is_admin:
             query = query.eq("user_id", user.id)
             
         response = query.execute()
-        return response.data
+        return list(reversed(response.data or []))
     except Exception as e:
         print(f"Fetch logs error: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch logs.")
 
+
+@app.get("/usage/summary")
+async def get_usage_summary(
+    days: int = Query(30, ge=1),
+    granularity: str = Query("day"),
+    user_id: Optional[str] = Query(None),
+    user = Depends(get_current_user)
+):
+    """
+    Usage totals, a time series and per-tool/model (and, for admins, per-user) breakdowns,
+    read from usage_rollups — cost scales with buckets, not with audit volume.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(GRANULARITIES)}.")
+    if days > MAX_RANGE_DAYS[granularity]:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RANGE_DAYS[granularity]} days of '{granularity}' buckets per request.")
+
+    try:
+        # 1. Admins may see everyone (or one user); regular users only themselves
+        profile_res = supabase.table("profiles").select("role").eq("id", user.id).execute()
+        is_admin = bool(profile_res.data) and profile_res.data[0].get("role") == "admin"
+        if not is_admin:
+            user_id = user.id
+
+        # 2. Read the buckets in range and fold them
+        now = datetime.now(timezone.utc)
+        start = now - timedelta(days=days)
+        rows = fetch_rollups(supabase, granularity, start, user_id)
+        return summarize(rows, granularity, start, now, include_users=is_admin and not user_id)
+    except Exception as e:
+        print(f"Usage summary error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch usage summary.")
+
 @app.post("/admin/users")
 async def create_admin_user(request: UserCreateRequest, admin_user = Depends(get_current_user)):
     # 1. Verify caller is an admin
@@ -442,6 +593,135 @@ async def create_admin_user(request: UserCreateRequest, admin_user = Depends(get
         print(f"Provision user error: {e}")
         raise HTTPException(status_code=500, detail="Error provisioning user.")
 
+def find_profile_id_by_email(email: str) -> Optional[str]:
+    """Case-insensitive profile lookup; LIKE wildcards in the address are escaped."""
+    pattern = re.sub(r"([\\%_])", r"\\\1", email)
+    try:
+        res = supabase.table("profiles").select("id").ilike("email", pattern).limit(1).execute()
+    except Exception as e:
+        print(f"Profile lookup error for {email}: {e}")
+        return None
+    return res.data[0]["id"] if res.data else None
+
+@app.post("/admin/users/bulk")
+async def bulk_create_users(request: Request, admin_user = Depends(get_current_user)):
+    """
+    Provision many users at once from a CSV upload (multipart field 'file') or a JSON array.
+    All rows are validated before anything is created. Accounts are created with bounded
+    concurrency, profile updates are written in batches, and per-row results are streamed
+    back as NDJSON. Re-running the same file is safe: existing emails are not re-created,
+    and only the profile fields present in the upload are applied to them.
+    """
+    # 1. Verify caller is an admin
+    profile_res = supabase.table("profiles").select("role").eq("id", admin_user.id).execute()
+    if not profile_res.data or profile_res.data[0].get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized. Admin access required.")
+
+    # 2. Parse and validate every row up front
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="Missing CSV file in form field 'file'.")
+            raw_rows = parse_csv(await upload.read())
+        else:
+            body = await request.json()
+            raw_rows = body.get("users") if isinstance(body, dict) else body
+            if not isinstance(raw_rows, list):
+                raise HTTPException(status_code=400, detail="Expected a JSON array of users.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Bulk provision parse error: {e}")
+        raise HTTPException(status_code=400, detail="Could not parse the uploaded users. Upload a CSV or a JSON array.")
+
+    rows, errors = validate_rows(raw_rows)
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": f"{len(errors)} row(s) failed validation. Nothing was created.", "errors": errors})
+    if not rows:
+        raise HTTPException(status_code=400, detail="No users found in the upload.")
+
+    # 3. Look up which emails already have accounts (idempotent re-runs), 100 per query
+    existing_ids: dict[str, str] = {}
+    emails = [row.email for row in rows]
+    for i in range(0, len(emails), 100):
+        res = supabase.table("profiles").select("id, email").in_("email", emails[i:i+100]).execute()
+        for profile in res.data or []:
+            if profile.get("email"):
+                existing_ids[profile["email"].lower()] = profile["id"]
+
+    semaphore = asyncio.Semaphore(BULK_PROVISION_CONCURRENCY)
+
+    async def provision(row_num: int, row: BulkUserRow) -> dict:
+        if row.email in existing_ids:
+            return {"row": row_num, "email": row.email, "status": "exists", "user_id": existing_ids[row.email]}
+        password = row.password or generate_password()
+        async with semaphore:
+            try:
+                new_user = await asyncio.to_thread(supabase.auth.admin.create_user, {
+                    "email": row.email,
+                    "password": password,
+                    "email_confirm": True,
+                    "user_metadata": {
+                        "full_name": row.full_name,
+                        "company_name": row.company_name
+                    }
+                })
+            except Exception as e:
+                if "already" in str(e).lower():
+                    # The lookup above is an exact match, so a profile stored with different casing lands here
+                    user_id = await asyncio.to_thread(find_profile_id_by_email, row.email)
+                    if user_id:
+                        return {"row": row_num, "email": row.email, "status": "exists", "user_id": user_id}
+                print(f"Bulk provision error for row {row_num}: {e}")
+                error = "Email is already registered." if "already" in str(e).lower() else "Error creating auth user."
+                return {"row": row_num, "email": row.email, "status": "failed", "error": error}
+        if not new_user or not new_user.user:
+            return {"row": row_num, "email": row.email, "status": "failed", "error": "Error creating auth user."}
+        result = {"row": row_num, "email": row.email, "status": "created", "user_id": new_user.user.id}
+        if not row.password:
+            result["generated_password"] = password
+        return result
+
+    async def stream_results():
+        counts = {"created": 0, "exists": 0, "failed": 0}
+        # Work in waves so each wave's profile updates are one batched write and results stream as they land
+        for start in range(0, len(rows), BULK_PROVISION_WAVE):
+            wave = list(enumerate(rows[start:start + BULK_PROVISION_WAVE], start=start + 1))
+            results = await asyncio.gather(*(provision(row_num, row) for row_num, row in wave))
+
+            # 4. The trigger creates each profile; apply limits/company/role in grouped updates.
+            # Existing accounts only get fields the upload provided, and the caller's own role is never changed.
+            assignments = []
+            for res, (_, row) in zip(results, wave):
+                if not res.get("user_id"):
+                    continue
+                existing = res["status"] == "exists"
+                if res["user_id"] == admin_user.id and "role" in row.model_fields_set:
+                    row = row.model_copy()
+                    row.model_fields_set.discard("role")
+                assignments.append((res["user_id"], row, existing))
+            for payload, user_ids in group_by_profile_update(assignments):
+                try:
+                    await asyncio.to_thread(lambda: supabase.table("profiles").update(payload).in_("id", user_ids).execute())
+                except Exception as e:
+                    print(f"Bulk profile update error: {e}")
+                    failed_ids = set(user_ids)
+                    for res in results:
+                        if res.get("user_id") in failed_ids:
+                            res["status"] = "failed"
+                            res["error"] = "Account exists but profile settings could not be applied. Re-run to retry."
+
+            for res in results:
+                counts[res["status"]] += 1
+                yield json.dumps(res) + "\n"
+
+        yield json.dumps({"summary": {"total": len(rows), **counts}}) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.put("/admin/users/{target_user_id}/password")
 async def reset_user_password(
     target_user_id: str, 
@@ -494,21 +774,7 @@ async def ingest_markdown(
         text = re.sub(r'\n{3,}', '\n\n', text).strip()
 
         # 3. Split into ~500-word chunks (roughly 3000 chars) with overlap
-        chunk_size = 3000
-        overlap = 300
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-            # Try to break at a paragraph boundary
-            if end < len(text):
-                last_para = text.rfind('\n\n', start, end)
-                if last_para > start + overlap:
-                    end = last_para
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            start = end - overlap if end < len(text) else len(text)
+        chunks = chunk_markdown(text)
 
         if not chunks:
             raise HTTPException(status_code=400, detail="No content found in the file.")
@@ -530,6 +796,13 @@ async def ingest_markdown(
             raise HTTPException(status_code=500, detail=f"Failed to generate embeddings from Gemini API: {str(e)}")
 
         # 5. Fast Batch Insert to Supabase
+        # Make sure this tool's KB has its HNSW index (a no-op once it exists; tools added through
+        # tool_config are indexed by trigger, but a KB can be ingested for any tool_id)
+        try:
+            supabase.rpc("create_labour_laws_tool_index", {"p_tool_id": tool_id}).execute()
+        except Exception as e:
+            print(f"Could not ensure the KB index for tool '{tool_id}': {e}")
+
         ingested = 0
         rows_to_insert = [
             {"content": chunk, "embedding": emb, "tool_id": tool_id, "filename": file.filename} 
@@ -540,8 +813,10 @@ async def ingest_markdown(
         for i in range(0, len(rows_to_insert), 50):
             batch = rows_to_insert[i:i+50]
             try:
-                supabase.table("labour_laws").insert(batch).execute()
+                insert_res = supabase.table("labour_laws").insert(batch).execute()
                 ingested += len(batch)
+                # Keep this worker's BM25 partition in step; other workers pick it up on their next signature check
+                await asyncio.to_thread(lexical_index.add_rows, tool_id, insert_res.data or [])
             except Exception as e:
                 print(f"Failed to insert batch {i}-{i+50}: {e}")
 
@@ -647,6 +922,7 @@ async def delete_kb_file(
             .eq("tool_id", tool_id)\
             .eq("filename", filename)\
             .execute()
+        await asyncio.to_thread(lexical_index.remove_file, tool_id, filename)
             
         return {"success": True, "message": f"Deleted file '{filename}' from tool '{tool_id}'"}
     except Exception as e:
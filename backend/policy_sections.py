@@ -0,0 +1,143 @@
+"""
+Section-level incremental re-audit.
+
+Clients revise a policy and re-upload it many times; any edit changes the file
+SHA-256 and misses the whole-file cache. Instead the policy text is split into
+sections whose boundaries depend only on nearby content (numbered clause
+headings, or a sentence whose fingerprint hits a fixed modulus), so an edit
+in one clause leaves every other section's hash unchanged. Findings are
+cached per (section hash, tool_id, KB version) in `policy_section_findings`
+and only changed sections are sent to Gemini.
+"""
+import re
+import json
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+# Same window as the original single-pass audit (policy_text[:6000])
+POLICY_CHAR_BUDGET = 6000
+MIN_SECTION_CHARS = 400
+MAX_SECTION_CHARS = 2000
+# ~1 in 8 sentences ends a section once MIN_SECTION_CHARS is reached
+BOUNDARY_MODULUS = 8
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.;:!?])\s+(?=[A-Z0-9(\["])')
+# "1.", "4.2", "12.3.1", "(a)", "Section 5", "Clause 3", "Chapter IV"
+_HEADING_RE = re.compile(r'^(?:\d+(?:\.\d+)*\.?\s|\([a-z0-9]+\)\s|(?:section|clause|chapter|part|article)\s+[0-9ivxlc]+\b)', re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Section:
+    section_id: str   # "S1", "S2", ... — position in this upload, used in the prompt
+    text: str
+    hash: str         # sha256 of the section text — stable across uploads
+
+    @property
+    def weight(self) -> int:
+        return len(self.text)
+
+
+def _fingerprint(sentence: str) -> int:
+    return int(hashlib.sha1(sentence.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def split_sections(text: str, budget: int = POLICY_CHAR_BUDGET) -> list[Section]:
+    """
+    Content-defined split of `text` into sections, keeping only sections that
+    start within the first `budget` characters.
+    """
+    sentences = [s for s in _SENTENCE_SPLIT_RE.split(text.strip()) if s]
+    groups: list[list[str]] = []
+    current: list[str] = []
+    current_len = 0
+    for sentence in sentences:
+        if current and (
+            (current_len >= MIN_SECTION_CHARS and (_HEADING_RE.match(sentence) or _fingerprint(current[-1]) % BOUNDARY_MODULUS == 0))
+            or current_len + len(sentence) > MAX_SECTION_CHARS
+        ):
+            groups.append(current)
+            current, current_len = [], 0
+        current.append(sentence)
+        current_len += len(sentence) + 1
+    if current:
+        groups.append(current)
+
+    sections = []
+    offset = 0
+    for group in groups:
+        if offset >= budget:
+            break
+        section_text = " ".join(group)
+        sections.append(Section(
+            section_id=f"S{len(sections) + 1}",
+            text=section_text,
+            hash=hashlib.sha256(section_text.encode("utf-8")).hexdigest(),
+        ))
+        offset += len(section_text) + 1
+    return sections
+
+
+def format_sections_for_prompt(sections: list[Section]) -> str:
+    return "\n\n".join(f"[{s.section_id}] {s.text}" for s in sections)
+
+
+def parse_section_results(response_text: str, sections: list[Section]) -> Optional[dict[str, dict]]:
+    """
+    Map the model's per-section JSON back to section hashes.
+    Returns None unless every section in `sections` has a result: a reply in the
+    wrong shape (e.g. a single overall score) or one that skips sections must not
+    be merged, cached or logged as if it were a complete audit.
+    """
+    try:
+        parsed = json.loads(response_text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("sections"), list):
+        return None
+    by_id = {s.section_id: s for s in sections}
+    results = {}
+    for item in parsed["sections"]:
+        if not isinstance(item, dict):
+            continue
+        section = by_id.get(str(item.get("section_id", "")).strip("[] "))
+        if section is None:
+            continue
+        try:
+            score = max(0, min(100, int(item.get("compliance_score", 50))))
+        except (TypeError, ValueError):
+            score = 50
+        raw_findings = item.get("findings")
+        findings = [str(f) for f in raw_findings if f] if isinstance(raw_findings, list) else []
+        results[section.hash] = {"compliance_score": score, "findings": findings}
+    if any(s.hash not in results for s in sections):
+        return None
+    return results
+
+
+def merge_section_results(sections: list[Section], results: dict[str, dict]) -> tuple[int, list[str]]:
+    """Length-weighted mean score and findings in document order, de-duplicated."""
+    total_weight = 0
+    weighted_score = 0
+    findings: list[str] = []
+    seen = set()
+    for section in sections:
+        result = results.get(section.hash)
+        if result is None:
+            continue
+        total_weight += section.weight
+        weighted_score += section.weight * result["compliance_score"]
+        for finding in result["findings"]:
+            if finding not in seen:
+                seen.add(finding)
+                findings.append(finding)
+    score = round(weighted_score / total_weight) if total_weight else 50
+    return score, findings
+
+
+def expire_section_findings(supabase, max_age_days: int):
+    """Delete cache entries older than the read window. Best-effort: runs after the response."""
+    try:
+        supabase.rpc("expire_old_section_findings", {"p_max_age_days": max_age_days}).execute()
+    except Exception as e:
+        print(f"Failed to expire old section findings: {e}")
@@ -0,0 +1,160 @@
+"""
+Audit preflight — lock/delete state, role, quota and hash-cache in one call.
+
+`run_preflight` calls the `audit_preflight` RPC (see
+supabase/migrations/20261018000001_audit_preflight.sql). If the function
+hasn't been deployed yet it falls back to the original per-table queries, so
+backend and migration can ship in either order.
+
+`LocalPreflightStore` is an in-memory stand-in with the same semantics and the
+same `.rpc(...).execute().data` surface as the Supabase client, so the audit
+gatekeeping logic can be exercised offline:
+
+    store = LocalPreflightStore(profiles=[...], api_logs=[...])
+    pf = run_preflight(store, user_id, file_hash, "labour-audit")
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+DEFAULT_DAILY_LIMIT = 3
+ADMIN_REMAINING = 999
+
+
+@dataclass(frozen=True)
+class Preflight:
+    found: bool
+    role: Optional[str]
+    is_locked: bool
+    is_deleted: bool
+    daily_limit: int
+    usage_today: int
+    cached: Optional[dict]
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @property
+    def remaining(self) -> int:
+        if self.is_admin:
+            return ADMIN_REMAINING
+        return max(0, self.daily_limit - self.usage_today)
+
+    @classmethod
+    def from_row(cls, data: dict) -> "Preflight":
+        limit = data.get("daily_audit_limit")
+        return cls(
+            found=bool(data.get("found")),
+            role=data.get("role"),
+            is_locked=bool(data.get("is_locked")),
+            is_deleted=bool(data.get("is_deleted")),
+            daily_limit=DEFAULT_DAILY_LIMIT if limit is None else int(limit),
+            usage_today=int(data.get("usage_today") or 0),
+            cached=data.get("cached") or None,
+        )
+
+
+def _today_start_iso() -> str:
+    return datetime.utcnow().date().isoformat()
+
+
+def _legacy_preflight(supabase, user_id: str, file_hash: Optional[str], tool_id: str) -> dict:
+    """Pre-RPC behaviour: three separate queries."""
+    profile_res = supabase.table("profiles").select("*").eq("id", user_id).execute()
+    profile = profile_res.data[0] if profile_res.data else None
+
+    logs_res = supabase.table("api_logs").select("id").eq("user_id", user_id).gte("created_at", _today_start_iso()).execute()
+
+    cached = None
+    if file_hash:
+        def cached_query():
+            return supabase.table("api_logs").select("*").eq("user_id", user_id).eq("filename", file_hash)\
+                .not_.is_("compliance_score", "null")
+
+        # Filter on tool before LIMIT 1, like the SQL function: rows without a tool_id are labour-audit
+        tool_filter = "tool_id.eq.labour-audit,tool_id.is.null" if tool_id == "labour-audit" else f"tool_id.eq.{tool_id}"
+        try:
+            cached_res = cached_query().or_(tool_filter).order("created_at", desc=True).limit(1).execute()
+        except Exception:
+            # tool_id may not exist yet on un-migrated databases, where every row is labour-audit
+            cached_res = cached_query().order("created_at", desc=True).limit(1).execute() if tool_id == "labour-audit" else None
+        if cached_res and cached_res.data:
+            cached = cached_res.data[0]
+
+    return {
+        "found": profile is not None,
+        "role": (profile or {}).get("role"),
+        "is_locked": (profile or {}).get("is_locked"),
+        "is_deleted": (profile or {}).get("is_deleted"),
+        "daily_audit_limit": (profile or {}).get("daily_audit_limit"),
+        "usage_today": len(logs_res.data) if logs_res.data else 0,
+        "cached": cached,
+    }
+
+
+def run_preflight(supabase, user_id: str, file_hash: Optional[str] = None, tool_id: str = "labour-audit") -> Preflight:
+    params = {"p_user_id": user_id, "p_file_hash": file_hash, "p_tool_id": tool_id}
+    try:
+        res = supabase.rpc("audit_preflight", params).execute()
+        return Preflight.from_row(res.data or {})
+    except Exception as rpc_err:
+        print(f"audit_preflight RPC unavailable ({rpc_err}). Falling back to per-table queries.")
+        return Preflight.from_row(_legacy_preflight(supabase, user_id, file_hash, tool_id))
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return self
+
+
+class LocalPreflightStore:
+    """Offline stand-in for the `audit_preflight` SQL function."""
+
+    def __init__(self, profiles: Optional[list[dict]] = None, api_logs: Optional[list[dict]] = None):
+        self.profiles = {p["id"]: p for p in (profiles or [])}
+        self.api_logs = list(api_logs or [])
+
+    def rpc(self, name: str, params: dict) -> _Result:
+        if name != "audit_preflight":
+            raise ValueError(f"LocalPreflightStore does not implement RPC '{name}'")
+        return _Result(self.audit_preflight(params["p_user_id"], params.get("p_file_hash"), params.get("p_tool_id", "labour-audit")))
+
+    def audit_preflight(self, user_id: str, file_hash: Optional[str] = None, tool_id: str = "labour-audit", now: Optional[datetime] = None) -> dict:
+        now = now or datetime.now(timezone.utc)
+        day_start = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        profile = self.profiles.get(user_id)
+        user_logs = [log for log in self.api_logs if log.get("user_id") == user_id]
+
+        cached = None
+        if file_hash:
+            hits = [
+                log for log in user_logs
+                if log.get("filename") == file_hash and (log.get("tool_id") or "labour-audit") == tool_id
+                and log.get("compliance_score") is not None
+            ]
+            if hits:
+                latest = max(hits, key=lambda log: _as_datetime(log["created_at"]))
+                cached = {k: latest.get(k) for k in ("compliance_score", "findings", "model_id")}
+
+        limit = (profile or {}).get("daily_audit_limit")
+        return {
+            "found": profile is not None,
+            "role": (profile or {}).get("role"),
+            "is_locked": bool((profile or {}).get("is_locked") or False),
+            "is_deleted": bool((profile or {}).get("is_deleted") or False),
+            "daily_audit_limit": DEFAULT_DAILY_LIMIT if limit is None else limit,
+            "usage_today": sum(1 for log in user_logs if _as_datetime(log["created_at"]) >= day_start),
+            "cached": cached,
+        }
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
@@ -0,0 +1,100 @@
+"""
+Build-once file cache for small read-mostly values, across gunicorn workers.
+
+Each worker is a separate process, so without this every worker would run
+the same Supabase queries to build values like the compiled tool registry.
+When SHARED_STATE_DIR is set (e.g. /dev/shm/auditai), the first worker to
+need a value builds it under a file lock and writes a pickled snapshot; the
+others read that file instead of hitting Supabase again. Every worker still
+holds its own unpickled copy: this saves round trips, not memory, so it is
+only meant for small values. Snapshots are keyed by a version string, so a
+changed version transparently triggers a rebuild.
+
+Without SHARED_STATE_DIR (local dev, Vercel) everything degrades to a
+per-process cache with identical semantics.
+"""
+import os
+import pickle
+from typing import Any, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines — no cross-process locking needed there
+    fcntl = None
+
+SHARED_STATE_DIR = os.environ.get("SHARED_STATE_DIR")
+
+# name -> (version, value). Per-process memo in front of the shared snapshot.
+_local: dict[str, tuple[str, Any]] = {}
+
+
+def _paths(name: str) -> tuple[str, str]:
+    return (
+        os.path.join(SHARED_STATE_DIR, f"{name}.snap"),
+        os.path.join(SHARED_STATE_DIR, f"{name}.lock"),
+    )
+
+
+def _read_snapshot(path: str, version: str) -> Optional[bytes]:
+    """The payload of the snapshot at `path` if it exists and matches `version`."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    header, sep, payload = data.partition(b"\n")
+    if not sep or header.decode("utf-8", errors="replace") != version:
+        return None
+    return payload
+
+
+def _write_snapshot(path: str, version: str, payload: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(version.encode("utf-8") + b"\n")
+        f.write(payload)
+    os.replace(tmp_path, path)  # atomic: readers see old or new, never partial
+
+
+def _load_or_build(name: str, version: str, build_payload: Callable[[], bytes]) -> bytes:
+    """Return the snapshot payload for (name, version), building it under a lock if needed."""
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+    path, lock_path = _paths(name)
+
+    payload = _read_snapshot(path, version)
+    if payload is not None:
+        return payload
+
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another worker may have built it while we waited for the lock.
+            payload = _read_snapshot(path, version)
+            if payload is None:
+                payload = build_payload()
+                _write_snapshot(path, version, payload)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return payload
+
+
+def get_shared(name: str, version: str, build: Callable[[], Any]) -> Any:
+    """
+    Return the value for `name` at `version`, calling `build()` at most once per
+    container (or once per process when SHARED_STATE_DIR is unset).
+    The value must be picklable. Snapshots are only ever written by this
+    process's own workers, so unpickling them is safe.
+    """
+    cached = _local.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    if not SHARED_STATE_DIR:
+        value = build()
+    else:
+        value = pickle.loads(_load_or_build(name, version, lambda: pickle.dumps(build(), protocol=pickle.HIGHEST_PROTOCOL)))
+
+    _local[name] = (version, value)
+    return value
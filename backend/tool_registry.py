@@ -0,0 +1,150 @@
+"""
+Tool registry — per-tool audit settings compiled once from `tool_runtime_config`.
+
+Prompts and retrieval settings live in tool_runtime_config, which only the
+service role can read; tool_config (readable by every client) just supplies
+the set of tool ids. Each tool becomes an immutable ToolSpec (system prompt, retrieval parameters,
+model). The registry is loaded at import time and re-checked against
+tool_registry_version() every REGISTRY_REFRESH_SECONDS by a background
+thread, so edits in the admin panel take effect without a redeploy. Lookups
+are a plain dict access and never touch the network.
+
+If the registry table/RPC haven't been migrated yet, or Supabase is
+unreachable, the built-in DEFAULT_PROMPTS keep audits working exactly as
+before.
+"""
+import os
+import time
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from shared_state import get_shared
+
+REGISTRY_REFRESH_SECONDS = float(os.environ.get("REGISTRY_REFRESH_SECONDS", "30"))
+
+# HNSW search breadth for match_labour_laws when tool_runtime_config.ef_search is unset
+# (see phase20_hnsw_match.sql). Tune with scripts/bench_match_labour_laws.py.
+KB_EF_SEARCH = int(os.environ.get("KB_EF_SEARCH", "40"))
+
+FALLBACK_TOOL_ID = "labour-audit"
+
+# Seed prompts — used until tool_runtime_config.system_prompt is populated
+DEFAULT_PROMPTS = {
+    "labour-audit": """You are an expert Indian Labour Law Compliance Auditor specializing in the 4 new Labour Codes enacted in 2019-2020 (in effect from 2025):
+1. Code on Wages, 2019
+2. Industrial Relations Code, 2020
+3. Code on Social Security, 2020
+4. Occupational Safety, Health and Working Conditions Code, 2020
+
+Review the provided Employee Policy and identify specific compliance gaps or satisfied requirements. Be precise — cite specific sections/chapters of the codes.""",
+    "wage-compliance": """You are an expert Indian Wage Compliance Auditor. Review the policy specifically for the Code on Wages 2019. Identify gaps in minimum wages, payment terms, deductions, or bonuses. Cite specific sections.""",
+    "social-security": """You are an expert Indian Social Security Compliance Auditor. Review the policy for the Code on Social Security 2020. Identify gaps in provident fund, gratuity, ESI, maternity benefits, or compensation. Cite specific sections.""",
+    "workplace-safety": """You are an expert Indian Workplace Safety Auditor. Review the policy for the Occupational Safety, Health and Working Conditions Code 2020. Identify gaps in workplace safety standard, working hours, and conditions. Cite specific sections.""",
+    "ir-compliance": """You are an expert Indian Industrial Relations Auditor. Review the policy for the Industrial Relations Code 2020. Identify gaps in dispute resolution, collective bargaining, strikes, or worker committees. Cite specific sections."""
+}
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    tool_id: str
+    system_prompt: str
+    match_threshold: float = 0.5
+    match_count: int = 3
+    ef_search: int = KB_EF_SEARCH
+    context_chars: int = 800
+    model_id: str = "gemini-2.5-flash"
+    version: int = 0
+
+
+def _setting(row: dict, key: str, default):
+    value = row.get(key)
+    return default if value is None else value
+
+
+def compile_tools(rows: list[dict], default_model: str) -> dict[str, ToolSpec]:
+    """Turn registry rows (tool id + runtime settings) into ToolSpecs, filling gaps from the defaults."""
+    by_id = {row["id"]: row for row in rows if row.get("id")}
+    # Tools without their own prompt fall back to the general labour-audit prompt
+    fallback_prompt = (by_id.get(FALLBACK_TOOL_ID) or {}).get("system_prompt") or DEFAULT_PROMPTS[FALLBACK_TOOL_ID]
+
+    tools = {}
+    for tool_id in set(by_id) | set(DEFAULT_PROMPTS):
+        row = by_id.get(tool_id, {})
+        tools[tool_id] = ToolSpec(
+            tool_id=tool_id,
+            system_prompt=row.get("system_prompt") or DEFAULT_PROMPTS.get(tool_id, fallback_prompt),
+            # `is None`, not `or`: 0 is a legitimate setting (e.g. match_threshold)
+            match_threshold=float(_setting(row, "match_threshold", 0.5)),
+            match_count=int(_setting(row, "match_count", 3)),
+            ef_search=int(_setting(row, "ef_search", KB_EF_SEARCH)),
+            context_chars=int(_setting(row, "context_chars", 800)),
+            model_id=row.get("model_id") or default_model,
+            version=int(_setting(row, "version", 0)),
+        )
+    return tools
+
+
+class ToolRegistry:
+    def __init__(self, supabase, default_model: str):
+        self._supabase = supabase
+        self._default_model = default_model
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._refresher: Optional[threading.Thread] = None
+        self._tools: Mapping[str, ToolSpec] = MappingProxyType(compile_tools([], default_model))
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def _fetch_version(self) -> str:
+        res = self._supabase.rpc("tool_registry_version", {}).execute()
+        return str(res.data)
+
+    def _fetch_rows(self) -> list[dict]:
+        tool_ids = self._supabase.table("tool_config").select("id").execute().data or []
+        settings = self._supabase.table("tool_runtime_config").select(
+            "tool_id, system_prompt, match_threshold, match_count, ef_search, context_chars, model_id, version"
+        ).execute().data or []
+        by_id = {row["tool_id"]: row for row in settings}
+        # Every listed tool gets a row; tools without settings compile from the defaults
+        return [{**by_id.get(row["id"], {}), "id": row["id"]} for row in tool_ids]
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the registry if the DB version changed. Returns True if it was swapped."""
+        with self._lock:
+            try:
+                version = self._fetch_version()
+                if version == self._version and not force:
+                    return False
+                rows = get_shared("tool_registry", version, self._fetch_rows)
+            except Exception as e:
+                print(f"Tool registry refresh failed, keeping version {self._version}: {e}")
+                return False
+            # Swap in one assignment so readers never see a half-built map
+            self._tools = MappingProxyType(compile_tools(rows, self._default_model))
+            self._version = version
+            print(f"Tool registry loaded: {len(self._tools)} tools (version {version[:8]})")
+            return True
+
+    def start_refresher(self, interval: float = REGISTRY_REFRESH_SECONDS):
+        """Re-check the registry version every `interval` seconds on a daemon thread, off the request path."""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.refresh()
+
+        self._refresher = threading.Thread(target=loop, name="tool-registry-refresh", daemon=True)
+        self._refresher.start()
+
+    def get(self, tool_id: str) -> Optional[ToolSpec]:
+        """O(1) lookup. Returns None for unknown tool IDs."""
+        return self._tools.get(tool_id)
+
+    def tool_ids(self) -> list[str]:
+        return sorted(self._tools)
@@ -0,0 +1,161 @@
+"""
+Usage dashboards read from pre-aggregated rollups instead of raw api_logs.
+
+`usage_rollups` holds one row per (hour|day bucket, user, tool, model) and
+is kept current by a trigger on api_logs. Cache hits never write an api_logs
+row (they must not count against the daily quota), so the backend records
+them here directly. See supabase/migrations/20261018000003_usage_rollups.sql.
+
+Latency is stored as a fixed histogram so p95 can be merged across any set of
+buckets; the reported p95 is the upper bound of the bin it falls in (60000
+for the open-ended >= 60s bin).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# Upper bounds of the latency histogram bins; the final bin is >= the last bound.
+# Mirrored by usage_latency_hist() in the usage_rollups migration — keep in sync.
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000, 30000, 45000, 60000)
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Longest range served per granularity, which bounds the number of buckets read
+MAX_RANGE_DAYS = {"hour": 14, "day": 366}
+NIL_USER_ID = "00000000-0000-0000-0000-000000000000"
+PAGE_SIZE = 1000
+
+_COUNTERS = ("request_count", "cache_hit_count", "prompt_tokens", "completion_tokens", "total_tokens", "latency_sum_ms", "latency_count")
+
+
+def latency_percentile(hist: list[int], q: float = 0.95) -> Optional[int]:
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(hist):
+        seen += count
+        if seen >= rank:
+            return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
+
+
+class UsageStats:
+    """Sums rollup rows; counters and histograms are additive, so any grouping works."""
+
+    def __init__(self):
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+        self.hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, row: dict):
+        for key in _COUNTERS:
+            self.counters[key] += row.get(key) or 0
+        for i, count in enumerate((row.get("latency_hist") or [])[:len(self.hist)]):
+            self.hist[i] += count or 0
+
+    def to_dict(self) -> dict:
+        c = self.counters
+        audits = c["request_count"] + c["cache_hit_count"]
+        return {
+            "requests": c["request_count"],
+            "cache_hits": c["cache_hit_count"],
+            "cache_hit_rate": round(c["cache_hit_count"] / audits, 4) if audits else 0.0,
+            "prompt_tokens": c["prompt_tokens"],
+            "completion_tokens": c["completion_tokens"],
+            "total_tokens": c["total_tokens"],
+            "mean_latency_ms": round(c["latency_sum_ms"] / c["latency_count"]) if c["latency_count"] else None,
+            "p95_latency_ms": latency_percentile(self.hist, 0.95),
+        }
+
+
+def bucket_floor(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def fetch_rollups(supabase, granularity: str, start: datetime, user_id: Optional[str] = None) -> list[dict]:
+    """Rows from the bucket containing `start` onwards, matching the series summarize() builds."""
+    rows = []
+    offset = 0
+    while True:
+        query = supabase.table("usage_rollups").select("*")\
+            .eq("granularity", granularity).gte("bucket_start", bucket_floor(start, granularity).isoformat())
+        if user_id:
+            query = query.eq("user_id", user_id)
+        res = query.order("bucket_start").order("user_id").order("tool_id").order("model_id")\
+            .range(offset, offset + PAGE_SIZE - 1).execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    return rows
+
+
+def summarize(rows: list[dict], granularity: str, start: datetime, now: datetime, include_users: bool) -> dict:
+    """Shape rollup rows into totals, a gap-free time series and per-user/tool/model breakdowns."""
+    today_start = bucket_floor(now, "day")
+    totals, today = UsageStats(), UsageStats()
+    series: dict[str, UsageStats] = {}
+    by_user: dict[str, UsageStats] = {}
+    users_today: dict[str, UsageStats] = {}
+    user_models: dict[str, dict[str, UsageStats]] = {}
+    by_tool: dict[str, UsageStats] = {}
+    by_model: dict[str, UsageStats] = {}
+
+    step = GRANULARITIES[granularity]
+    bucket = bucket_floor(start, granularity)
+    while bucket <= now:
+        series[bucket.isoformat()] = UsageStats()
+        bucket += step
+
+    for row in rows:
+        bucket_start = datetime.fromisoformat(row["bucket_start"]).astimezone(timezone.utc)
+        totals.add(row)
+        series.setdefault(bucket_start.isoformat(), UsageStats()).add(row)
+        by_tool.setdefault(row["tool_id"], UsageStats()).add(row)
+        by_model.setdefault(row["model_id"], UsageStats()).add(row)
+        if include_users:
+            by_user.setdefault(row["user_id"], UsageStats()).add(row)
+            user_models.setdefault(row["user_id"], {}).setdefault(row["model_id"], UsageStats()).add(row)
+        if bucket_start >= today_start:
+            today.add(row)
+            if include_users:
+                users_today.setdefault(row["user_id"], UsageStats()).add(row)
+
+    summary = {
+        "granularity": granularity,
+        "start": bucket_floor(start, granularity).isoformat(),
+        "end": now.isoformat(),
+        "totals": totals.to_dict(),
+        "today": today.to_dict(),
+        "series": [{"bucket_start": key, **stats.to_dict()} for key, stats in sorted(series.items())],
+        "by_tool": [{"tool_id": key, **stats.to_dict()} for key, stats in sorted(by_tool.items())],
+        "by_model": [{"model_id": key, **stats.to_dict()} for key, stats in sorted(by_model.items())],
+    }
+    if include_users:
+        summary["by_user"] = [
+            {
+                "user_id": None if key == NIL_USER_ID else key,
+                **stats.to_dict(),
+                "requests_today": users_today[key].counters["request_count"] if key in users_today else 0,
+                "by_model": [{"model_id": model_id, **model_stats.to_dict()} for model_id, model_stats in sorted(user_models[key].items())],
+            }
+            for key, stats in sorted(by_user.items())
+        ]
+    return summary
+
+
+def record_cache_hit(supabase, user_id: str, tool_id: str, model_id: str):
+    """Count an audit served from cache. Best-effort: dashboards must never fail an audit."""
+    try:
+        supabase.rpc("record_usage", {
+            "p_at": datetime.now(timezone.utc).isoformat(),
+            "p_user_id": user_id,
+            "p_tool_id": tool_id,
+            "p_model_id": model_id,
+            "p_requests": 0,
+            "p_cache_hits": 1,
+        }).execute()
+    except Exception as e:
+        print(f"Failed to record cache hit in usage rollups: {e}")
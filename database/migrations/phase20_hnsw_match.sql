@@ -0,0 +1,123 @@
+-- Phase 20: ANN index for match_labour_laws
+--
+-- Until now labour_laws.embedding had no vector index (only B-trees on tool_id
+-- and filename), so every audit did an exact sequential scan and evaluated
+-- `embedding <=> query_embedding` twice per row (WHERE + ORDER BY).
+--
+-- This migration:
+--   1. Adds one partial HNSW cosine index per tool_id, so each tool's KB is its
+--      own small graph and the tool filter never discards ANN candidates.
+--   2. Adds create_labour_laws_tool_index() so new tools get their index without
+--      hand-written DDL: an AFTER INSERT trigger on tool_config calls it for new
+--      tools, and /admin/ingest-md calls it for any tool_id it writes (a KB can be
+--      ingested for a tool_id that has no tool_config row).
+--   3. Rewrites match_labour_laws to compute the distance once, order by the
+--      indexable expression, apply the threshold after the LIMIT, and take a
+--      per-call hnsw.ef_search (p_ef_search).
+--
+-- Requires pgvector >= 0.5.0 (HNSW support).
+
+-- 1. Helper: create the partial HNSW index for one tool (idempotent).
+-- SECURITY DEFINER because only the table owner may create indexes, and both
+-- the trigger (admin client session) and the backend (service role) call it.
+CREATE OR REPLACE FUNCTION create_labour_laws_tool_index (p_tool_id text)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  idx_name text := 'labour_laws_embedding_hnsw_' || regexp_replace(lower(p_tool_id), '[^a-z0-9]+', '_', 'g');
+BEGIN
+  EXECUTE format(
+    'CREATE INDEX IF NOT EXISTS %I ON public.labour_laws USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64) WHERE tool_id = %L',
+    idx_name,
+    p_tool_id
+  );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION create_labour_laws_tool_index(text) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_labour_laws_tool_index(text) TO service_role;
+
+-- 2. Partial indexes for every tool currently in the registry, and for every
+-- tool added later (a new tool has no rows yet, so its index builds instantly)
+SELECT create_labour_laws_tool_index(id) FROM public.tool_config;
+SELECT create_labour_laws_tool_index('labour-audit');
+
+CREATE OR REPLACE FUNCTION tool_config_create_kb_index()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM create_labour_laws_tool_index(NEW.id);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_tool_config_create_kb_index ON public.tool_config;
+CREATE TRIGGER trg_tool_config_create_kb_index
+AFTER INSERT ON public.tool_config
+FOR EACH ROW
+EXECUTE FUNCTION tool_config_create_kb_index();
+
+-- 3. Rewrite the RPC: single distance evaluation, index-ordered scan, tunable ef_search
+-- The previous 4-arg signature is dropped so PostgREST resolves calls unambiguously.
+DROP FUNCTION IF EXISTS match_labour_laws(vector, float, int, text);
+
+CREATE OR REPLACE FUNCTION match_labour_laws (
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int,
+  p_tool_id text DEFAULT 'labour-audit',
+  p_ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id bigint,
+  content text,
+  similarity float,
+  tool_id text,
+  filename text
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- ef_search must be >= match_count or HNSW returns fewer rows than asked for.
+  -- is_local = true scopes the setting to this call's transaction.
+  PERFORM set_config('hnsw.ef_search', greatest(p_ef_search, match_count)::text, true);
+
+  -- Dynamic SQL inlines tool_id as a literal so the planner can match the
+  -- partial index predicate (a generic plan with a $param cannot).
+  -- The inner query orders by the raw distance operator so it is served by the
+  -- HNSW index; the distance is projected once and reused for the threshold
+  -- and similarity instead of being recomputed.
+  RETURN QUERY EXECUTE format(
+    $q$
+    select
+      candidates.id,
+      candidates.content,
+      1 - candidates.distance as similarity,
+      candidates.tool_id,
+      candidates.filename
+    from (
+      select
+        labour_laws.id,
+        labour_laws.content,
+        labour_laws.tool_id,
+        labour_laws.filename,
+        labour_laws.embedding <=> $1 as distance
+      from labour_laws
+      where labour_laws.tool_id = %L
+      order by labour_laws.embedding <=> $1
+      limit $2
+    ) candidates
+    where candidates.distance < 1 - $3
+    order by candidates.distance
+    $q$,
+    p_tool_id
+  )
+  USING query_embedding, match_count, match_threshold;
+END;
+$$;
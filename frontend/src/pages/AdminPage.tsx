@@ -31,17 +31,29 @@ interface Profile {
     audits_used_today?: number;
 }
 
-interface AuditLog {
-    id: string;
-    user_id: string;
-    model_id: string;
-    provider: string;
-    response_time_ms: number;
+interface UsageStats {
+    requests: number;
+    cache_hits: number;
     total_tokens: number;
-    created_at: string;
-    filename: string;
+    mean_latency_ms: number | null;
+    p95_latency_ms: number | null;
+}
+
+interface UserUsage extends UsageStats {
+    user_id: string | null;
+    requests_today: number;
+    by_model: (UsageStats & { model_id: string })[];
 }
 
+interface UsageSummary {
+    totals: UsageStats;
+    today: UsageStats;
+    by_user: UserUsage[];
+}
+
+// Per-user totals on the Users tab cover this many days of daily rollups
+const USAGE_SUMMARY_DAYS = 366;
+
 interface ModelHealth {
     model_id: string;
     provider: string;
@@ -94,7 +106,7 @@ interface PlanConfig {
 export function AdminPage({ session, adminProfile }: { session: any, adminProfile: any }) {
     const [profiles, setProfiles] = useState<Profile[]>([]);
     const [waitingList, setWaitingList] = useState<WaitingListEntry[]>([]);
-    const [auditLogs, setAuditLogs] = useState<AuditLog[]>([]);
+    const [usageSummary, setUsageSummary] = useState<UsageSummary | null>(null);
     const [loading, setLoading] = useState(true);
     const [expandedUser, setExpandedUser] = useState<string | null>(null);
     const [healthData, setHealthData] = useState<ModelHealth[]>([
@@ -282,13 +294,16 @@ export function AdminPage({ session, adminProfile }: { session: any, adminProfil
             // ✅ Run ALL queries in parallel — no sequential awaits
             const [
                 { data: profileData, error: profileError },
-                { data: logData, error: logError },
+                usageRes,
                 { data: waitingData, error: waitingError },
                 { data: toolData },
                 { data: planData },
             ] = await Promise.all([
                 supabase.from('profiles').select('*').order('created_at', { ascending: false }),
-                supabase.from('api_logs').select('*').order('created_at', { ascending: false }).limit(200),
+                // Server-side rollups: full history without shipping raw api_logs rows to the browser
+                fetch(`${API_URL}/usage/summary?days=${USAGE_SUMMARY_DAYS}&granularity=day`, {
+                    headers: { 'Authorization': `Bearer ${session.access_token}` }
+                }).then(res => res.ok ? res.json() : Promise.reject(new Error(`HTTP ${res.status}`))).catch(err => ({ error: err })),
                 supabase.from('waiting_list').select('*').order('created_at', { ascending: false }),
                 supabase.from('tool_config').select('*').order('sort_order', { ascending: true }),
                 supabase.from('plan_config').select('*').order('sort_order', { ascending: true }),
@@ -299,31 +314,27 @@ export function AdminPage({ session, adminProfile }: { session: any, adminProfil
                 toast.error("Failed to load user profiles.");
             }
 
-            if (logError) {
-                console.error("Error fetching logs:", logError);
-            } else if (logData) {
-                setAuditLogs(logData);
+            if (usageRes.error) {
+                console.error("Error fetching usage summary:", usageRes.error);
+                if (profileData) setProfiles(profileData);
+            } else {
+                const summary = usageRes as UsageSummary;
+                setUsageSummary(summary);
 
-                // Calculate per-user consumption from fetched logs
+                // Per-user consumption comes pre-aggregated from the rollups
                 if (profileData) {
-                    const today = new Date();
-                    today.setHours(0, 0, 0, 0);
-
+                    const usageByUser = new Map<string | null, UserUsage>(summary.by_user.map(u => [u.user_id, u]));
                     const updatedProfiles = profileData.map(p => {
-                        const userLogs = logData.filter(l => l.user_id === p.id);
-                        const todayLogs = userLogs.filter(l => new Date(l.created_at) >= today);
-                        const totalTokens = userLogs.reduce((sum, l) => sum + (l.total_tokens || 0), 0);
+                        const usage = usageByUser.get(p.id);
                         return {
                             ...p,
-                            total_tokens_used: totalTokens,
-                            total_audits_done: userLogs.length,
-                            audits_used_today: todayLogs.length
+                            total_tokens_used: usage?.total_tokens || 0,
+                            total_audits_done: usage ? usage.requests + usage.cache_hits : 0,
+                            audits_used_today: usage?.requests_today || 0
                         };
                     });
                     setProfiles(updatedProfiles);
                 }
-            } else if (profileData) {
-                setProfiles(profileData);
             }
 
             if (waitingError) {
@@ -516,12 +527,15 @@ export function AdminPage({ session, adminProfile }: { session: any, adminProfil
     };
 
     const UserExpansion = ({ profile }: { profile: Profile }) => {
-        const userLogs = auditLogs.filter(l => l.user_id === profile.id);
+        const userUsage = usageSummary?.by_user.find(u => u.user_id === profile.id);
 
         // Tool usage breakdown by model
-        const toolUsage = [
-            { model: 'gemini-2.5-flash', label: 'Gemini Flash 2.5', count: userLogs.filter(l => l.model_id?.includes('gemini')).length, tokens: userLogs.filter(l => l.model_id?.includes('gemini')).reduce((s, l) => s + (l.total_tokens || 0), 0) },
-        ];
+        const toolUsage = (userUsage?.by_model || []).map(m => ({
+            model: m.model_id,
+            label: m.model_id,
+            count: m.requests,
+            tokens: m.total_tokens,
+        }));
 
         return (
             <div className="bg-[#FBFAF5] p-6 border-t border-[#E6E4E0]">
@@ -545,7 +559,7 @@ export function AdminPage({ session, adminProfile }: { session: any, adminProfil
                                             <td className="px-3 py-2 text-right font-mono text-[#5E5E5E]">{row.tokens.toLocaleString()}</td>
                                         </tr>
                                     ))}
-                                    {userLogs.length === 0 && (
+                                    {toolUsage.length === 0 && (
                                         <tr><td colSpan={3} className="px-3 py-4 text-center text-[#8F837A] italic">No audit history recorded</td></tr>
                                     )}
                                 </tbody>
@@ -792,7 +806,7 @@ export function AdminPage({ session, adminProfile }: { session: any, adminProfil
                                 </CardHeader>
                                 <CardContent>
                                     <div className="text-2xl font-bold text-[#2C2A28] font-serif">
-                                        {auditLogs.filter(l => new Date(l.created_at) >= new Date(new Date().setHours(0, 0, 0, 0))).length}
+                                        {usageSummary?.today.requests ?? 0}
                                     </div>
                                 </CardContent>
                             </Card>
@@ -35,6 +35,8 @@ interface LabourAuditPageProps {
 }
 
 const MAX_FILE_SIZE = 20 * 1024 * 1024; // 20MB backend limit
+// The backend sniffs the real format from file content; extensions only filter the picker
+const SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".odt", ".html", ".htm", ".md", ".txt"];
 
 export const LabourAuditPage: React.FC<LabourAuditPageProps> = ({ session, profile, apiUrl }) => {
     const navigate = useNavigate();
@@ -96,14 +98,14 @@ export const LabourAuditPage: React.FC<LabourAuditPageProps> = ({ session, profi
     const handleFileDrop = (e: React.DragEvent<HTMLDivElement>) => {
         e.preventDefault();
         const droppedFile = e.dataTransfer.files?.[0];
-        if (droppedFile?.type === 'application/pdf' || droppedFile?.name.endsWith('.docx')) {
+        if (droppedFile && SUPPORTED_EXTENSIONS.some(ext => droppedFile.name.toLowerCase().endsWith(ext))) {
             if (droppedFile.size > MAX_FILE_SIZE) {
                 toast.error("File is too large (> 20MB).");
             } else {
                 setFile(droppedFile);
             }
         } else {
-            toast.error("Please upload a PDF or Word (.docx) file.");
+            toast.error("Please upload a PDF, Word (.docx), OpenDocument (.odt), HTML, Markdown or text file.");
         }
     };
 
@@ -133,7 +135,17 @@ export const LabourAuditPage: React.FC<LabourAuditPageProps> = ({ session, profi
             });
 
             const data = await response.json();
-            if (!response.ok) throw new Error(data.detail || "Audit failed.");
+            if (!response.ok) {
+                // Deadline errors come back as a structured detail object with a user-facing message
+                const detail = typeof data.detail === 'string' ? data.detail : data.detail?.message;
+                throw new Error(detail || "Audit failed.");
+            }
+            if (data.sections_reused > 0) {
+                toast.info(`Re-used findings for ${data.sections_reused} of ${data.sections_total} unchanged policy sections.`);
+            }
+            if (data.degraded) {
+                toast.warning("Audit completed with reduced knowledge base retrieval due to time limits. Results may be less specific.");
+            }
 
             clearInterval(progressInterval);
             setScanProgress(100);
@@ -332,9 +344,9 @@ export const LabourAuditPage: React.FC<LabourAuditPageProps> = ({ session, profi
                                     </div>
                                     <Card className="border-2 border-dashed border-zinc-200" onDragOver={e => e.preventDefault()} onDrop={handleFileDrop} onClick={() => fileInputRef.current?.click()}>
                                         <CardContent className="p-10 text-center">
-                                            <input type="file" accept=".pdf,.docx" className="hidden" ref={fileInputRef} onChange={e => e.target.files?.[0] && setFile(e.target.files[0])} />
+                                            <input type="file" accept={SUPPORTED_EXTENSIONS.join(',')} className="hidden" ref={fileInputRef} onChange={e => e.target.files?.[0] && setFile(e.target.files[0])} />
                                             <UploadCloud className="w-8 h-8 mx-auto text-[#606C5A] mb-4" />
-                                            <h3 className="text-lg font-semibold">{file ? file.name : "Drop PDF or Word file here"}</h3>
+                                            <h3 className="text-lg font-semibold">{file ? file.name : "Drop your policy document here"}</h3>
                                             <Progress value={file ? 100 : 0} className="h-1 mt-4" />
                                             <Button className="mt-6 w-full max-w-sm" disabled={!file || (auditStatus?.remaining === 0 && profile?.role !== 'admin')} onClick={e => { e.stopPropagation(); handleAudit(); }}>
                                                 Run Audit
@@ -22,10 +22,27 @@ interface ApiLog {
     findings?: string[] | null;
 }
 
+interface UsageStats {
+    requests: number;
+    cache_hits: number;
+    total_tokens: number;
+    mean_latency_ms: number | null;
+    p95_latency_ms: number | null;
+}
+
+interface UsageSummary {
+    totals: UsageStats;
+    today: UsageStats;
+    series: (UsageStats & { bucket_start: string })[];
+}
+
+const USAGE_DAYS = 30;
+
 const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.DEV ? 'http://localhost:8000' : '/api');
 
 export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLimit?: number, role?: string }) {
     const [logs, setLogs] = useState<ApiLog[]>([]);
+    const [summary, setSummary] = useState<UsageSummary | null>(null);
     const [loading, setLoading] = useState(true);
     const [expandedRow, setExpandedRow] = useState<number | null>(null);
 
@@ -34,17 +51,23 @@ export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLi
             if (!token) return;
             setLoading(true);
             try {
-                const response = await fetch(`${API_URL}/logs`, {
-                    headers: {
-                        'Authorization': `Bearer ${token}`
-                    }
-                });
+                // Recent rows for the history table; totals and trends come from the server-side rollups
+                const headers = { 'Authorization': `Bearer ${token}` };
+                const [response, summaryResponse] = await Promise.all([
+                    fetch(`${API_URL}/logs`, { headers }),
+                    fetch(`${API_URL}/usage/summary?days=${USAGE_DAYS}&granularity=day`, { headers }),
+                ]);
                 if (response.ok) {
                     const data = await response.json();
                     setLogs(data);
                 } else {
                     console.error("Failed to fetch logs from backend", response.status);
                 }
+                if (summaryResponse.ok) {
+                    setSummary(await summaryResponse.json());
+                } else {
+                    console.error("Failed to fetch usage summary from backend", summaryResponse.status);
+                }
             } catch (error) {
                 console.error("Backend fetch error:", error);
             }
@@ -54,12 +77,15 @@ export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLi
     }, []);
 
     // Format data for Recharts AreaChart
-    const chartData = logs.map((log) => ({
-        time: new Date(log.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-        tokens: log.total_tokens,
+    const chartData = (summary?.series || []).map((bucket) => ({
+        time: new Date(bucket.bucket_start).toLocaleDateString([], { month: 'short', day: 'numeric' }),
+        tokens: bucket.total_tokens,
     }));
 
-    const totalTokensUsed = logs.reduce((acc, log) => acc + log.total_tokens, 0);
+    const totalTokensUsed = summary ? summary.totals.total_tokens : logs.reduce((acc, log) => acc + log.total_tokens, 0);
+    const auditsToday = summary
+        ? summary.today.requests
+        : logs.filter(l => new Date(l.created_at).toDateString() === new Date().toDateString()).length;
     // Rough estimation for Gemini 2.5 Flash pricing: $0.075 / 1M Input Tokens, $0.30 / 1M Output Tokens
     // For simplicity of display, we'll blend it to an estimated $0.10 per 1M total tokens
     const estimatedCost = (totalTokensUsed / 1000000) * 0.10;
@@ -81,7 +107,7 @@ export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLi
                     </CardHeader>
                     <CardContent>
                         <div className="text-3xl font-bold tracking-tight">
-                            {logs.filter(l => new Date(l.created_at).toDateString() === new Date().toDateString()).length}
+                            {auditsToday}
                             <span className="text-zinc-400 text-xl font-medium"> / {dailyLimit || '-'}</span>
                         </div>
                         <p className="text-xs text-muted-foreground mt-1">Daily quota remaining</p>
@@ -97,7 +123,7 @@ export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLi
                             </CardHeader>
                             <CardContent>
                                 <div className="text-3xl font-bold tracking-tight">{totalTokensUsed.toLocaleString()}</div>
-                                <p className="text-xs text-muted-foreground mt-1">Across all API requests</p>
+                                <p className="text-xs text-muted-foreground mt-1">Across all API requests, last {USAGE_DAYS} days</p>
                             </CardContent>
                         </Card>
                         <Card>
@@ -123,7 +149,7 @@ export function UsagePage({ token, dailyLimit, role }: { token?: string, dailyLi
                     <CardContent className="h-[300px]">
                         {loading ? (
                             <div className="flex items-center justify-center h-full text-zinc-500">Loading chart data...</div>
-                        ) : logs.length === 0 ? (
+                        ) : chartData.every(d => d.tokens === 0) ? (
                             <div className="flex items-center justify-center h-full text-zinc-500">No data available yet</div>
                         ) : (
                             <ResponsiveContainer width="100%" height="100%">
@@ -0,0 +1,63 @@
+"""
+Backfill usage_rollups from api_logs (see supabase/migrations/20261018000003_usage_rollups.sql).
+
+The migration already seeds the rollups once and the api_logs trigger keeps them
+current; run this after a trigger outage or on a restored database. It calls
+backfill_usage_rollups() one UTC day at a time so no single statement runs long.
+
+By default only missing buckets are created, so re-running is always safe.
+--overwrite rebuilds the log-derived counters of each day instead. Only use it for
+days api_logs still holds in full: older rows are pruned per user
+(enforce_api_log_limits), and overwriting would replace real history with less.
+
+Usage:
+    python scripts/backfill_usage_rollups.py --days 7
+    python scripts/backfill_usage_rollups.py --since 2026-10-01 --overwrite
+"""
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")  # Service role key: the RPC is not granted to clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill usage_rollups from api_logs, one day at a time.")
+    parser.add_argument("--days", type=int, default=30, help="Backfill this many days up to today (default 30)")
+    parser.add_argument("--since", help="Start date YYYY-MM-DD (UTC); overrides --days")
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild existing buckets instead of only filling gaps")
+    args = parser.parse_args()
+
+    if not all([SUPABASE_URL, SUPABASE_KEY]):
+        print("Error: Required environment variables are missing.")
+        exit(1)
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.since:
+        day = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    else:
+        day = today - timedelta(days=args.days - 1)
+
+    total = 0
+    while day <= today:
+        # p_to is widened server-side to the end of its UTC day, so pass the day itself
+        res = supabase.rpc("backfill_usage_rollups", {
+            "p_from": day.isoformat(),
+            "p_to": day.isoformat(),
+            "p_overwrite": args.overwrite,
+        }).execute()
+        rows = res.data or 0
+        total += rows
+        print(f"{day.date()}: {rows} bucket rows {'rebuilt' if args.overwrite else 'created'}")
+        day += timedelta(days=1)
+
+    print(f"Backfill complete: {total} bucket rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Extraction and chunking micro-benchmarks over a generated document corpus.
+
+Covers the text hot paths that no test exercises:
+  - extractors.extract_and_clean_text   (PDF, /audit)
+  - extractors.extract_text_from_docx   (DOCX, /audit)
+  - markdown extractor via extract_text (MD, /audit)
+  - chunking.chunk_markdown             (/admin/ingest-md, incl. its whitespace cleanup)
+  - scripts/ingest.py chunk_text        (bulk PDF ingest)
+
+The corpus is generated in memory from a fixed seed, so the same --seed and
+--pages always produce byte-identical inputs and results can be compared
+across commits. Runs fully offline: no Supabase, Gemini or .env needed.
+
+Three document profiles per size:
+  prose       numbered clauses of policy-style text
+  tables      mostly tabular pages (wage schedules, leave registers)
+  whitespace  ragged spacing, blank runs, indentation and tabs
+
+A "page" is one PDF page; DOCX/MD documents carry the same generated content
+per page, so pages/s is comparable across formats.
+
+Usage:
+    python scripts/bench_extraction.py                          # 1,10,100,500 pages
+    python scripts/bench_extraction.py --quick                  # 1,10 pages, 3 repeats
+    python scripts/bench_extraction.py --output before.json
+    python scripts/bench_extraction.py --output after.json --compare before.json
+
+Output is one row per (target, profile, pages): median time, MB/s, pages/s,
+peak RSS growth and whether the output hash was identical on every repeat.
+RSS is measured in a forked child per case (Linux only; other platforms
+report null), so C allocations in lxml/pypdf are counted too.
+With --compare, cases slower than --threshold or whose output changed are
+flagged and the exit code is 1.
+"""
+import gc
+import io
+import os
+import ctypes
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+import contextlib
+from typing import Callable, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from extractors import extract_and_clean_text, extract_text_from_docx, extract_text, registered_extractors  # noqa: E402
+from chunking import chunk_markdown  # noqa: E402
+from ingest import chunk_text  # noqa: E402
+
+PROFILES = ["prose", "tables", "whitespace"]
+DEFAULT_PAGES = [1, 10, 100, 500]
+LINES_PER_PAGE = 46
+TABLE_ROWS_PER_PAGE = 30
+
+_WORDS = """
+employer employee wages gratuity overtime leave establishment contractor inspector notice period
+termination retrenchment bonus provident fund maternity benefit grievance committee shift roster
+register compliance standing orders appropriate government payment deduction allowance holiday
+welfare canteen creche safety hazard occupational health record return penalty appeal tribunal
+""".split()
+_HEADINGS = ["Section", "Clause", "Chapter", "Rule", "Schedule"]
+
+
+# --- Corpus generation ---
+
+class PageContent:
+    """One generated page: a heading plus either prose lines or table rows."""
+
+    def __init__(self, heading: str, lines: list[str], table: list[list[str]]):
+        self.heading = heading
+        self.lines = lines
+        self.table = table
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice([".", ".", ".", ";", ":"])
+
+
+def generate_pages(profile: str, n_pages: int, seed: int) -> list[PageContent]:
+    rng = random.Random(f"{seed}:{profile}")
+    pages = []
+    for page_num in range(1, n_pages + 1):
+        heading = f"{rng.choice(_HEADINGS)} {page_num}. {rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)}"
+        lines: list[str] = []
+        table: list[list[str]] = []
+        if profile == "tables":
+            lines = [_sentence(rng) for _ in range(4)]
+            table = [["Category", "Basic (INR)", "Allowance (INR)", "Leave days"]]
+            for _ in range(TABLE_ROWS_PER_PAGE):
+                table.append([
+                    f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                    f"{rng.randint(9000, 60000):,}",
+                    f"{rng.randint(500, 8000):,}",
+                    str(rng.randint(8, 30)),
+                ])
+        elif profile == "whitespace":
+            while len(lines) < LINES_PER_PAGE:
+                if rng.random() < 0.3:
+                    lines.extend([""] * rng.randint(1, 4))
+                    continue
+                words = _sentence(rng).split(" ")
+                gaps = [" " * rng.randint(1, 6) if rng.random() < 0.4 else " " for _ in words]
+                indent = rng.choice(["", "    ", "\t", "        "])
+                lines.append(indent + "".join(w + g for w, g in zip(words, gaps)).rstrip() + " " * rng.randint(0, 8))
+            lines = lines[:LINES_PER_PAGE]
+        else:
+            clause = 1
+            while len(lines) < LINES_PER_PAGE:
+                lines.append(f"{page_num}.{clause} {_sentence(rng)}")
+                lines.extend(_sentence(rng) for _ in range(rng.randint(2, 5)))
+                clause += 1
+            lines = lines[:LINES_PER_PAGE]
+        pages.append(PageContent(heading, lines, table))
+    return pages
+
+
+def _pdf_escape(text: str) -> str:
+    text = text.encode("latin-1", errors="replace").decode("latin-1").replace("\t", "    ")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: list[PageContent]) -> bytes:
+    """Minimal uncompressed PDF with real text operators, one content stream per page."""
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")     # placeholders, filled once page ids are known
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for page in pages:
+        ops = ["BT", "/F1 14 Tf", "50 800 Td", f"({_pdf_escape(page.heading)}) Tj", "/F1 10 Tf", "14 TL", "T*"]
+        for line in page.lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        y = 780 - 14 * (len(page.lines) + 2)
+        for row in page.table:
+            for col, cell in enumerate(row):
+                ops.append(f"BT /F1 9 Tf {50 + col * 130} {y} Td ({_pdf_escape(cell)}) Tj ET")
+            y -= 12
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+    xref_at = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_at))
+    return out.getvalue()
+
+
+def build_docx(pages: list[PageContent]) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    for page in pages:
+        doc.add_heading(page.heading, level=2)
+        for line in page.lines:
+            doc.add_paragraph(line)
+        if page.table:
+            table = doc.add_table(rows=0, cols=len(page.table[0]))
+            for row in page.table:
+                cells = table.add_row().cells
+                for cell, value in zip(cells, row):
+                    cell.text = value
+        doc.add_page_break()
+    buf = io.BytesIO()
+    doc.save(buf)
+    # python-docx stamps core-properties timestamps; the bytes differ per run but the
+    # extracted text does not, which is what output_sha256 checks
+    return buf.getvalue()
+
+
+def build_markdown(pages: list[PageContent]) -> bytes:
+    parts = []
+    for page in pages:
+        parts.append(f"## {page.heading}\n")
+        parts.append("\n".join(page.lines) + "\n")
+        if page.table:
+            parts.append("| " + " | ".join(page.table[0]) + " |")
+            parts.append("|" + "---|" * len(page.table[0]))
+            parts.extend("| " + " | ".join(row) + " |" for row in page.table[1:])
+            parts.append("")
+    return "\n".join(parts).encode("utf-8")
+
+
+# --- Targets ---
+
+_MARKDOWN_EXTRACTOR = next(e for e in registered_extractors() if e.name == "markdown")
+
+
+def _ingest_md_chunks(md_bytes: bytes) -> list[str]:
+    # Mirrors /admin/ingest-md before chunking
+    text = md_bytes.decode('utf-8', errors='replace')
+    text = re.sub(r'\n{3,}', '\n\n', text).strip()
+    return chunk_markdown(text)
+
+
+def _ingest_chunk_text(pdf_text: str) -> list[str]:
+    with contextlib.redirect_stdout(io.StringIO()):  # chunk_text prints a progress line per call
+        return chunk_text(pdf_text, 1000)
+
+
+# target name -> (input format, function)
+TARGETS: dict[str, tuple[str, Callable]] = {
+    "extract_pdf": ("pdf", extract_and_clean_text),
+    "extract_docx": ("docx", extract_text_from_docx),
+    "extract_markdown": ("md", lambda data: extract_text(_MARKDOWN_EXTRACTOR, data)),
+    "chunk_markdown": ("md", _ingest_md_chunks),
+    "ingest_chunk_text": ("pdf_text", _ingest_chunk_text),
+}
+
+
+def _output_hash(output) -> str:
+    if isinstance(output, list):
+        output = "\x1e".join(output)   # record separator keeps chunk boundaries in the hash
+    return hashlib.sha256(output.encode("utf-8")).hexdigest()
+
+
+def _input_size(data) -> int:
+    return len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+
+
+def _proc_status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def _malloc_trim():
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # not glibc: growth may be understated by memory the allocator kept
+
+
+def peak_rss_growth_mb(fn: Callable, data) -> Optional[float]:
+    """
+    Peak RSS added by one call, measured in a forked child: unlike tracemalloc
+    this includes the C heap (lxml, pypdf), and each case starts from its own
+    high-water mark instead of the largest case run so far.
+    """
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/clear_refs"):
+        return None
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            gc.collect()
+            _malloc_trim()  # hand freed heap (left over from the timed runs) back to the OS
+            base_kb = _proc_status_kb("VmRSS")
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")  # reset VmHWM to the current RSS
+            fn(data)
+            os.write(write_fd, str(_proc_status_kb("VmHWM") - base_kb).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        growth_kb = f.read()
+    os.waitpid(pid, 0)
+    return round(int(growth_kb) / 1024, 2) if growth_kb else None
+
+
+def run_case(fn: Callable, data, pages: int, repeats: int) -> dict:
+    fn(data)  # warm-up: lazy imports, regex compilation
+    times = []
+    hashes = set()
+    output = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        output = fn(data)
+        times.append(time.perf_counter() - t0)
+        hashes.add(_output_hash(output))
+
+    # Separate pass in a child process so measuring memory can't skew the timings
+    peak_rss_mb = peak_rss_growth_mb(fn, data)
+
+    median_s = statistics.median(times)
+    input_bytes = _input_size(data)
+    return {
+        "pages": pages,
+        "input_bytes": input_bytes,
+        "repeats": repeats,
+        "median_ms": round(median_s * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "mb_per_s": round(input_bytes / 1e6 / median_s, 2) if median_s else None,
+        "pages_per_s": round(pages / median_s, 1) if median_s else None,
+        "peak_rss_mb": peak_rss_mb,
+        "output_chars": len(output) if isinstance(output, str) else sum(len(c) for c in output),
+        "output_chunks": len(output) if isinstance(output, list) else None,
+        "output_sha256": sorted(hashes)[0],
+        "stable": len(hashes) == 1,
+    }
+
+
+def _repeats_for(pages: int, requested: int) -> int:
+    # Keep large cases bounded; the median of 3 is enough once a run takes seconds
+    return requested if pages <= 100 else min(requested, 3)
+
+
+def run_suite(page_sizes: list[int], profiles: list[str], targets: list[str], repeats: int, seed: int) -> list[dict]:
+    results = []
+    for profile in profiles:
+        for pages in page_sizes:
+            t0 = time.perf_counter()
+            content = generate_pages(profile, pages, seed)
+            inputs = {"pdf": build_pdf(content), "md": build_markdown(content)}
+            if any(TARGETS[t][0] == "docx" for t in targets):
+                inputs["docx"] = build_docx(content)
+            if any(TARGETS[t][0] == "pdf_text" for t in targets):
+                inputs["pdf_text"] = extract_and_clean_text(inputs["pdf"])
+            print(f"\n[{profile} x {pages} pages] corpus generated in {time.perf_counter() - t0:.1f}s "
+                  f"(pdf {len(inputs['pdf']) / 1e6:.2f} MB, md {len(inputs['md']) / 1e6:.2f} MB)")
+
+            for target in targets:
+                fmt, fn = TARGETS[target]
+                case = run_case(fn, inputs[fmt], pages, _repeats_for(pages, repeats))
+                case = {"name": f"{target}/{profile}/{pages}", "target": target, "profile": profile, **case}
+                results.append(case)
+                print(f"  {target:<18} {case['median_ms']:>10.2f} ms  {case['mb_per_s']:>8} MB/s  "
+                      f"{case['pages_per_s']:>9} pages/s  peak RSS +{case['peak_rss_mb']} MB  "
+                      f"{'stable' if case['stable'] else 'UNSTABLE'}")
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float, seed: int, min_delta_ms: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("seed") != seed:
+        print(f"\nWarning: baseline used seed {baseline.get('seed')}, this run used {seed}; output hashes will differ.")
+    base_cases = {c["name"]: c for c in baseline.get("cases", [])}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit', 'unknown')}), threshold +{threshold:.0%}:")
+    problems = 0
+    for case in results:
+        base = base_cases.get(case["name"])
+        if base is None:
+            continue
+        ratio = case["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        flags = []
+        # Sub-millisecond cases jitter by more than any threshold; ignore tiny absolute deltas
+        if ratio > 1 + threshold and case["median_ms"] - base["median_ms"] >= min_delta_ms:
+            flags.append("SLOWER")
+        if case["output_sha256"] != base["output_sha256"]:
+            flags.append("OUTPUT CHANGED")
+        if flags:
+            problems += 1
+        marker = ", ".join(flags) if flags else ("faster" if ratio < 1 - threshold else "ok")
+        print(f"  {case['name']:<40} {base['median_ms']:>10.2f} -> {case['median_ms']:>10.2f} ms  ({ratio:5.2f}x)  {marker}")
+    print(f"{problems} case(s) flagged." if problems else "No regressions.")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document extraction and chunking offline.")
+    parser.add_argument("--pages", default=",".join(map(str, DEFAULT_PAGES)), help="Comma-separated page counts (1-500)")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help=f"Subset of: {','.join(PROFILES)}")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"Subset of: {','.join(TARGETS)}")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--quick", action="store_true", help="1 and 10 pages, 3 repeats")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --output run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged by --compare (default 0.10)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Absolute slowdown below which --compare ignores a case (default 1.0)")
+    args = parser.parse_args()
+
+    page_sizes = [1, 10] if args.quick else [int(p) for p in args.pages.split(",") if p.strip()]
+    repeats = 3 if args.quick else args.repeats
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    for p in page_sizes:
+        if not 1 <= p <= 500:
+            parser.error(f"page count {p} out of range 1-500")
+    for p in profiles:
+        if p not in PROFILES:
+            parser.error(f"unknown profile '{p}'")
+    for t in targets:
+        if t not in TARGETS:
+            parser.error(f"unknown target '{t}'")
+
+    print(f"Extraction benchmark: pages={page_sizes} profiles={profiles} repeats={repeats} seed={args.seed}")
+    results = run_suite(page_sizes, profiles, targets, repeats, args.seed)
+
+    if args.output:
+        report = {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "cases": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        if compare(results, args.compare, args.threshold, args.seed, args.min_delta_ms):
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
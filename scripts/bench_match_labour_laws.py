@@ -0,0 +1,216 @@
+"""
+Recall-vs-latency benchmark for match_labour_laws (phase20_hnsw_match.sql).
+
+Builds a synthetic 100k-chunk labour_laws corpus in a LOCAL Postgres with
+pgvector, applies the phase20 migration verbatim, then compares the HNSW path
+at several ef_search values against an exact sequential scan (ground truth).
+
+NEVER point this at Supabase — it creates and truncates public.labour_laws.
+
+Usage:
+    pip install "psycopg[binary]" numpy   # numpy optional, speeds up generation
+    createdb kb_bench
+    python scripts/bench_match_labour_laws.py --dsn postgresql://postgres@localhost/kb_bench --reset
+
+Output is one row per ef_search: mean recall@k, p50/p95 latency in ms.
+Pick the smallest ef_search that clears your recall target and set KB_EF_SEARCH.
+"""
+import os
+import sys
+import time
+import math
+import random
+import argparse
+import statistics
+
+try:
+    import psycopg
+except ImportError:
+    print("Error: psycopg is required. pip install 'psycopg[binary]'")
+    exit(1)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIM = 768
+MIGRATION_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'migrations', 'phase20_hnsw_match.sql')
+TOOL_IDS = ["labour-audit", "wage-compliance", "social-security", "workplace-safety", "ir-compliance", "contract-review"]
+
+
+def normalize(vec: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+def vector_literal(vec) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
+
+
+class CorpusGenerator:
+    """Clustered unit vectors — real KB chunks cluster by topic, uniform noise would flatter HNSW."""
+
+    def __init__(self, n_clusters: int, seed: int):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed) if np else None
+        self.centroids = [self._random_unit() for _ in range(n_clusters)]
+
+    def _random_unit(self) -> list[float]:
+        if self.np_rng is not None:
+            v = self.np_rng.standard_normal(DIM)
+            return list(v / np.linalg.norm(v))
+        return normalize([self.rng.gauss(0, 1) for _ in range(DIM)])
+
+    def sample(self, spread: float = 0.35) -> list[float]:
+        centroid = self.rng.choice(self.centroids)
+        if self.np_rng is not None:
+            v = np.asarray(centroid) + spread * self.np_rng.standard_normal(DIM) / math.sqrt(DIM)
+            return list(v / np.linalg.norm(v))
+        return normalize([c + spread * self.rng.gauss(0, 1) / math.sqrt(DIM) for c in centroid])
+
+
+def setup_schema(conn, reset: bool):
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.labour_laws (
+                id bigserial PRIMARY KEY,
+                content text,
+                embedding vector(768),
+                tool_id text DEFAULT 'labour-audit',
+                filename text
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS labour_laws_tool_id_idx ON public.labour_laws (tool_id)")
+        cur.execute("CREATE TABLE IF NOT EXISTS public.tool_config (id text PRIMARY KEY)")
+        cur.execute("INSERT INTO public.tool_config (id) SELECT unnest(%s::text[]) ON CONFLICT DO NOTHING", (TOOL_IDS,))
+
+        cur.execute("SELECT count(*) FROM public.labour_laws")
+        existing = cur.fetchone()[0]
+        if existing and not reset:
+            print(f"labour_laws already has {existing} rows. Re-run with --reset to rebuild the corpus.")
+            return existing
+        cur.execute("TRUNCATE public.labour_laws RESTART IDENTITY")
+        # Drop ANN indexes so the bulk load isn't slowed by index maintenance
+        cur.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'labour_laws' AND indexname LIKE 'labour_laws_embedding_hnsw_%'
+        """)
+        for (name,) in cur.fetchall():
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+    conn.commit()
+    return 0
+
+
+def load_corpus(conn, gen: CorpusGenerator, rows: int):
+    print(f"Generating and loading {rows} chunks...")
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        with cur.copy("COPY public.labour_laws (content, embedding, tool_id, filename) FROM STDIN") as copy:
+            for i in range(rows):
+                tool_id = TOOL_IDS[i % len(TOOL_IDS)] if i % 2 else "labour-audit"  # labour-audit dominates, like prod
+                copy.write_row((f"Synthetic chunk {i}", vector_literal(gen.sample()), tool_id, f"bench_{i % 20}.md"))
+                if (i + 1) % 10000 == 0:
+                    print(f"  {i + 1}/{rows}")
+    conn.commit()
+    print(f"Loaded in {time.perf_counter() - t0:.1f}s")
+
+
+def apply_migration(conn):
+    print("Applying phase20_hnsw_match.sql (builds HNSW indexes)...")
+    t0 = time.perf_counter()
+    with open(MIGRATION_PATH) as f:
+        sql = f.read()
+    with conn.cursor() as cur:
+        cur.execute("SET maintenance_work_mem = '512MB'")
+        cur.execute(sql)
+        cur.execute("ANALYZE public.labour_laws")
+    conn.commit()
+    print(f"Migration applied in {time.perf_counter() - t0:.1f}s")
+
+
+def exact_top_k(conn, query: str, tool_id: str, k: int) -> tuple[list[int], float]:
+    """Ground truth: the pre-phase20 query shape with index scans disabled."""
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute("SET LOCAL enable_bitmapscan = off")
+        t0 = time.perf_counter()
+        cur.execute(
+            """
+            select id from labour_laws
+            where tool_id = %s
+            order by embedding <=> %s::vector
+            limit %s
+            """,
+            (tool_id, query, k),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        elapsed = (time.perf_counter() - t0) * 1000
+    conn.rollback()
+    return ids, elapsed
+
+
+def ann_top_k(conn, query: str, tool_id: str, k: int, ef_search: int) -> tuple[list[int], float]:
+    with conn.cursor() as cur:
+        t0 = time.perf_counter()
+        cur.execute(
+            "select id from match_labour_laws(%s::vector, %s, %s, %s, %s)",
+            (query, -1.0, k, tool_id, ef_search),  # threshold -1 keeps every candidate
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        elapsed = (time.perf_counter() - t0) * 1000
+    conn.rollback()
+    return ids, elapsed
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN", "postgresql://postgres@localhost:5432/kb_bench"))
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3, help="match_count (backend uses 3)")
+    parser.add_argument("--ef", default="10,20,40,80,160,320", help="comma-separated ef_search values")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="truncate and regenerate the corpus")
+    args = parser.parse_args()
+
+    if "supabase" in args.dsn:
+        print("Refusing to run against Supabase. Use a local scratch database.")
+        exit(1)
+
+    gen = CorpusGenerator(args.clusters, args.seed)
+    with psycopg.connect(args.dsn) as conn:
+        if not setup_schema(conn, args.reset):
+            load_corpus(conn, gen, args.rows)
+            apply_migration(conn)
+
+        queries = [(vector_literal(gen.sample()), gen.rng.choice(TOOL_IDS)) for _ in range(args.queries)]
+
+        print("Computing exact ground truth...")
+        truth, exact_ms = [], []
+        for q, tool_id in queries:
+            ids, ms = exact_top_k(conn, q, tool_id, args.k)
+            truth.append(set(ids))
+            exact_ms.append(ms)
+
+        print()
+        print(f"{'mode':<16}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'exact seqscan':<16}{1.0:>10.3f}{statistics.median(exact_ms):>10.2f}{percentile(exact_ms, 95):>10.2f}")
+        for ef in [int(x) for x in args.ef.split(",") if x.strip()]:
+            recalls, latencies = [], []
+            for (q, tool_id), expected in zip(queries, truth):
+                ids, ms = ann_top_k(conn, q, tool_id, args.k, ef)
+                latencies.append(ms)
+                recalls.append(len(expected & set(ids)) / max(1, len(expected)))
+            print(f"{'hnsw ef=' + str(ef):<16}{statistics.mean(recalls):>10.3f}{statistics.median(latencies):>10.2f}{percentile(latencies, 95):>10.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
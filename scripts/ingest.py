@@ -13,13 +13,10 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")  # Service role key to bypass RLS
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
-if not all([SUPABASE_URL, SUPABASE_KEY, GEMINI_API_KEY]):
-    print("Error: Required environment variables are missing.")
-    exit(1)
-
-# Initialize clients
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-genai_client = genai.Client(api_key=GEMINI_API_KEY)
+# Clients are created in main() so chunk_text/extract_and_clean_text can be
+# imported (e.g. by scripts/bench_extraction.py) without credentials.
+supabase: Client = None
+genai_client = None
 
 PDF_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'source_documents', 'labor_code_2025.pdf')
 CHUNK_SIZE = 1000
@@ -69,6 +66,15 @@ def generate_embedding(text: str) -> list[float]:
     return result.embeddings[0].values
 
 def main():
+    global supabase, genai_client
+    if not all([SUPABASE_URL, SUPABASE_KEY, GEMINI_API_KEY]):
+        print("Error: Required environment variables are missing.")
+        exit(1)
+
+    # Initialize clients
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    genai_client = genai.Client(api_key=GEMINI_API_KEY)
+
     try:
         text = extract_and_clean_text(PDF_PATH)
         chunks = chunk_text(text, CHUNK_SIZE)
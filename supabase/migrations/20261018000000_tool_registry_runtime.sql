@@ -0,0 +1,76 @@
+-- Runtime tool registry: move per-tool audit settings out of backend/main.py
+-- and into the database so new tools can be added without a redeploy.
+-- The backend compiles these rows once at startup and hot-reloads whenever
+-- tool_registry_version() changes.
+--
+-- The settings (system prompts in particular) live in their own table, not on
+-- tool_config: tool_config is readable by every client ("Users can view
+-- active tools" is USING (TRUE)). tool_runtime_config has RLS on and no
+-- policies, so only the service role (backend/tool_registry.py) can read or
+-- write it.
+
+-- 1. Audit settings per tool. Tools without a row use the defaults.
+CREATE TABLE IF NOT EXISTS tool_runtime_config (
+    tool_id TEXT PRIMARY KEY REFERENCES tool_config(id) ON DELETE CASCADE,
+    system_prompt TEXT,                                  -- NULL = use the 'labour-audit' prompt
+    match_threshold DOUBLE PRECISION DEFAULT 0.5,
+    match_count INTEGER DEFAULT 3,
+    ef_search INTEGER DEFAULT 40,
+    context_chars INTEGER DEFAULT 800,                   -- per-chunk cap sent to the model
+    model_id TEXT DEFAULT 'gemini-2.5-flash',
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE tool_runtime_config ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON tool_runtime_config FROM anon, authenticated;
+
+-- 2. Bump version on every edit so backends notice the change
+CREATE OR REPLACE FUNCTION bump_tool_runtime_config_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version := COALESCE(OLD.version, 0) + 1;
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_bump_tool_runtime_config_version ON tool_runtime_config;
+CREATE TRIGGER trg_bump_tool_runtime_config_version
+BEFORE UPDATE ON tool_runtime_config
+FOR EACH ROW
+EXECUTE FUNCTION bump_tool_runtime_config_version();
+
+-- 3. Cheap fingerprint of the whole registry: the set of tools plus each tool's
+-- settings version (changes on insert, update or delete of either table)
+CREATE OR REPLACE FUNCTION tool_registry_version()
+RETURNS TEXT
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT md5(COALESCE(string_agg(c.id || ':' || COALESCE(r.version, 0), ',' ORDER BY c.id), ''))
+  FROM tool_config c
+  LEFT JOIN tool_runtime_config r ON r.tool_id = c.id;
+$$;
+
+REVOKE EXECUTE ON FUNCTION tool_registry_version() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION tool_registry_version() TO service_role;
+
+-- 4. Seed prompts previously hard-coded in backend/main.py (for the tools that exist)
+INSERT INTO tool_runtime_config (tool_id, system_prompt)
+SELECT v.tool_id, v.system_prompt
+FROM (VALUES
+('labour-audit', 'You are an expert Indian Labour Law Compliance Auditor specializing in the 4 new Labour Codes enacted in 2019-2020 (in effect from 2025):
+1. Code on Wages, 2019
+2. Industrial Relations Code, 2020
+3. Code on Social Security, 2020
+4. Occupational Safety, Health and Working Conditions Code, 2020
+
+Review the provided Employee Policy and identify specific compliance gaps or satisfied requirements. Be precise — cite specific sections/chapters of the codes.'),
+('wage-compliance', 'You are an expert Indian Wage Compliance Auditor. Review the policy specifically for the Code on Wages 2019. Identify gaps in minimum wages, payment terms, deductions, or bonuses. Cite specific sections.'),
+('social-security', 'You are an expert Indian Social Security Compliance Auditor. Review the policy for the Code on Social Security 2020. Identify gaps in provident fund, gratuity, ESI, maternity benefits, or compensation. Cite specific sections.'),
+('workplace-safety', 'You are an expert Indian Workplace Safety Auditor. Review the policy for the Occupational Safety, Health and Working Conditions Code 2020. Identify gaps in workplace safety standard, working hours, and conditions. Cite specific sections.'),
+('ir-compliance', 'You are an expert Indian Industrial Relations Auditor. Review the policy for the Industrial Relations Code 2020. Identify gaps in dispute resolution, collective bargaining, strikes, or worker committees. Cite specific sections.')
+) AS v(tool_id, system_prompt)
+JOIN tool_config c ON c.id = v.tool_id
+ON CONFLICT (tool_id) DO NOTHING;
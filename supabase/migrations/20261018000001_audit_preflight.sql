@@ -0,0 +1,58 @@
+-- audit_preflight: everything /audit needs to know before doing real work,
+-- in ONE round trip instead of three (profile, today's usage, hash cache).
+-- Mirrored offline by backend/preflight.py::LocalPreflightStore — keep in sync.
+
+-- 1. Cache hits must be per tool: the same policy audited by two tools gives different findings
+ALTER TABLE api_logs ADD COLUMN IF NOT EXISTS tool_id TEXT;
+
+CREATE INDEX IF NOT EXISTS api_logs_user_created_idx ON api_logs (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS api_logs_user_filename_idx ON api_logs (user_id, filename, created_at DESC);
+
+-- 2. The preflight function
+CREATE OR REPLACE FUNCTION audit_preflight (
+  p_user_id uuid,
+  p_file_hash text DEFAULT NULL,
+  p_tool_id text DEFAULT 'labour-audit'
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+  WITH profile AS (
+    SELECT role, is_locked, is_deleted, daily_audit_limit
+    FROM profiles
+    WHERE id = p_user_id
+  ),
+  usage AS (
+    SELECT count(*) AS usage_today
+    FROM api_logs
+    WHERE user_id = p_user_id
+      AND created_at >= date_trunc('day', now() AT TIME ZONE 'utc') AT TIME ZONE 'utc'
+  ),
+  cached AS (
+    SELECT compliance_score, findings, model_id
+    FROM api_logs
+    WHERE p_file_hash IS NOT NULL
+      AND user_id = p_user_id
+      AND filename = p_file_hash
+      -- rows written before tool_id existed were all labour-audit runs
+      AND COALESCE(tool_id, 'labour-audit') = p_tool_id
+      -- usage-only rows (the model reply was unusable) carry no analysis to serve
+      AND compliance_score IS NOT NULL
+    ORDER BY created_at DESC
+    LIMIT 1
+  )
+  SELECT jsonb_build_object(
+    'found', EXISTS (SELECT 1 FROM profile),
+    'role', (SELECT role FROM profile),
+    'is_locked', COALESCE((SELECT is_locked FROM profile), false),
+    'is_deleted', COALESCE((SELECT is_deleted FROM profile), false),
+    'daily_audit_limit', COALESCE((SELECT daily_audit_limit FROM profile), 3),
+    'usage_today', (SELECT usage_today FROM usage),
+    'cached', (SELECT to_jsonb(cached) FROM cached)
+  );
+$$;
+
+-- 3. Only the backend (service role) may call it — it reads any user's state
+REVOKE EXECUTE ON FUNCTION audit_preflight(uuid, text, text) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION audit_preflight(uuid, text, text) TO service_role;
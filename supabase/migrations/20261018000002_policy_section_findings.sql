@@ -0,0 +1,38 @@
+-- Per-section findings cache for incremental re-audits (backend/policy_sections.py).
+-- A revised policy re-uses findings for every section whose text hash is unchanged,
+-- as long as the tool's prompt and knowledge base are the same version.
+-- Only findings are stored, never policy text.
+
+CREATE TABLE IF NOT EXISTS policy_section_findings (
+    section_hash TEXT NOT NULL,
+    tool_id TEXT NOT NULL,
+    kb_version TEXT NOT NULL,          -- '<tool_runtime_config.version>:<chunk count>:<max chunk id>'
+    compliance_score INTEGER NOT NULL,
+    findings JSONB NOT NULL DEFAULT '[]'::jsonb,
+    model_id TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (section_hash, tool_id, kb_version)
+);
+
+CREATE INDEX IF NOT EXISTS policy_section_findings_created_idx ON policy_section_findings (created_at);
+
+-- Backend-only table (service role bypasses RLS); no client access
+ALTER TABLE policy_section_findings ENABLE ROW LEVEL SECURITY;
+
+-- Retention: the backend calls this after caching new findings, with its
+-- SECTION_CACHE_DAYS (entries older than that are never read again)
+DROP FUNCTION IF EXISTS expire_old_section_findings();
+CREATE OR REPLACE FUNCTION expire_old_section_findings(p_max_age_days INTEGER DEFAULT 7)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH expired AS (
+    DELETE FROM policy_section_findings
+    WHERE created_at < now() - make_interval(days => p_max_age_days)
+    RETURNING 1
+  )
+  SELECT count(*)::INTEGER FROM expired;
+$$;
+
+REVOKE EXECUTE ON FUNCTION expire_old_section_findings(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION expire_old_section_findings(INTEGER) TO service_role;
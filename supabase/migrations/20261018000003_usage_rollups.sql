@@ -0,0 +1,206 @@
+-- Usage rollups for the admin and usage dashboards (backend/usage_rollups.py).
+-- api_logs only keeps the newest 5/50/500 rows per user (enforce_api_log_limits),
+-- so dashboards computed from raw logs show truncated history. Every api_logs
+-- insert is folded into hourly and daily buckets here instead; /usage/summary
+-- reads these rows, so its cost grows with buckets, not with audit volume.
+
+-- 1. Latency histogram helpers. Slot i counts latencies in [bounds[i-1], bounds[i]);
+-- the last slot is >= 60s. Mirrored by LATENCY_BUCKETS_MS in backend/usage_rollups.py — keep in sync.
+CREATE OR REPLACE FUNCTION usage_latency_hist(p_latency_ms integer)
+RETURNS integer[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT array_agg(
+    CASE WHEN p_latency_ms IS NOT NULL
+          AND slot = width_bucket(p_latency_ms, ARRAY[250, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000, 30000, 45000, 60000]) + 1
+         THEN 1 ELSE 0 END
+    ORDER BY slot
+  )
+  FROM generate_series(1, 13) AS slot;
+$$;
+
+CREATE OR REPLACE FUNCTION usage_hist_add(a integer[], b integer[])
+RETURNS integer[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT array_agg(COALESCE(x, 0) + COALESCE(y, 0) ORDER BY i)
+  FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i);
+$$;
+
+CREATE OR REPLACE AGGREGATE usage_hist_sum(integer[]) (
+  SFUNC = usage_hist_add,
+  STYPE = integer[],
+  INITCOND = '{0,0,0,0,0,0,0,0,0,0,0,0,0}'
+);
+
+-- 2. The rollup table. Buckets are UTC; deleted users keep their history under the nil uuid.
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day')),
+    bucket_start TIMESTAMPTZ NOT NULL,
+    user_id UUID NOT NULL,
+    tool_id TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,     -- audits that reached the model (= api_logs rows)
+    cache_hit_count BIGINT NOT NULL DEFAULT 0,   -- audits answered from the file or section cache
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+    latency_count BIGINT NOT NULL DEFAULT 0,
+    latency_hist INTEGER[] NOT NULL DEFAULT '{0,0,0,0,0,0,0,0,0,0,0,0,0}',
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (granularity, bucket_start, user_id, tool_id, model_id)
+);
+
+CREATE INDEX IF NOT EXISTS usage_rollups_user_idx ON usage_rollups (user_id, granularity, bucket_start);
+
+-- Backend-only table (service role bypasses RLS); no client access
+ALTER TABLE usage_rollups ENABLE ROW LEVEL SECURITY;
+
+-- 3. Incremental update: one event into its hour and day buckets
+CREATE OR REPLACE FUNCTION record_usage (
+  p_at timestamptz,
+  p_user_id uuid,
+  p_tool_id text,
+  p_model_id text,
+  p_requests integer DEFAULT 1,
+  p_cache_hits integer DEFAULT 0,
+  p_prompt_tokens integer DEFAULT 0,
+  p_completion_tokens integer DEFAULT 0,
+  p_total_tokens integer DEFAULT 0,
+  p_latency_ms integer DEFAULT NULL
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+  INSERT INTO usage_rollups AS r (
+    granularity, bucket_start, user_id, tool_id, model_id,
+    request_count, cache_hit_count, prompt_tokens, completion_tokens, total_tokens,
+    latency_sum_ms, latency_count, latency_hist
+  )
+  SELECT
+    g.granularity,
+    date_trunc(g.granularity, COALESCE(p_at, now()) AT TIME ZONE 'utc') AT TIME ZONE 'utc',
+    COALESCE(p_user_id, '00000000-0000-0000-0000-000000000000'),
+    -- rows written before tool_id existed were all labour-audit runs
+    COALESCE(p_tool_id, 'labour-audit'),
+    COALESCE(p_model_id, 'unknown'),
+    p_requests,
+    p_cache_hits,
+    COALESCE(p_prompt_tokens, 0),
+    COALESCE(p_completion_tokens, 0),
+    COALESCE(p_total_tokens, 0),
+    COALESCE(p_latency_ms, 0),
+    CASE WHEN p_latency_ms IS NULL THEN 0 ELSE 1 END,
+    usage_latency_hist(p_latency_ms)
+  FROM (VALUES ('hour'), ('day')) AS g(granularity)
+  ON CONFLICT (granularity, bucket_start, user_id, tool_id, model_id) DO UPDATE SET
+    request_count = r.request_count + EXCLUDED.request_count,
+    cache_hit_count = r.cache_hit_count + EXCLUDED.cache_hit_count,
+    prompt_tokens = r.prompt_tokens + EXCLUDED.prompt_tokens,
+    completion_tokens = r.completion_tokens + EXCLUDED.completion_tokens,
+    total_tokens = r.total_tokens + EXCLUDED.total_tokens,
+    latency_sum_ms = r.latency_sum_ms + EXCLUDED.latency_sum_ms,
+    latency_count = r.latency_count + EXCLUDED.latency_count,
+    latency_hist = usage_hist_add(r.latency_hist, EXCLUDED.latency_hist),
+    updated_at = now();
+$$;
+
+-- 4. Fold every audit log write into the rollups. A rollup failure must never
+-- fail the audit itself; backfill_usage_rollups() can repair the gap.
+CREATE OR REPLACE FUNCTION api_logs_usage_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    BEGIN
+        PERFORM record_usage(
+            NEW.created_at, NEW.user_id, NEW.tool_id, NEW.model_id,
+            1, 0, NEW.prompt_tokens, NEW.completion_tokens, NEW.total_tokens, NEW.response_time_ms
+        );
+    EXCEPTION WHEN OTHERS THEN
+        RAISE WARNING 'usage rollup skipped for api_logs row %: %', NEW.id, SQLERRM;
+    END;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_api_logs_usage_rollup ON api_logs;
+CREATE TRIGGER trg_api_logs_usage_rollup
+AFTER INSERT ON api_logs
+FOR EACH ROW
+EXECUTE FUNCTION api_logs_usage_rollup();
+
+-- 5. Backfill from whatever api_logs still holds. The range is widened to whole UTC days
+-- so no bucket is rebuilt from part of its logs.
+--   p_overwrite = false: only creates missing buckets (safe to re-run at any time).
+--   p_overwrite = true: replaces the log-derived counters of buckets in range (cache hits
+--     are kept). Only do this for ranges api_logs still holds in full — older rows
+--     have been pruned and overwriting would lose them.
+CREATE OR REPLACE FUNCTION backfill_usage_rollups (
+  p_from timestamptz DEFAULT '-infinity',
+  p_to timestamptz DEFAULT 'infinity',
+  p_overwrite boolean DEFAULT false
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_from timestamptz := date_trunc('day', p_from AT TIME ZONE 'utc') AT TIME ZONE 'utc';
+    v_to timestamptz := CASE WHEN isfinite(p_to)
+        THEN (date_trunc('day', p_to AT TIME ZONE 'utc') + interval '1 day') AT TIME ZONE 'utc'
+        ELSE p_to END;
+    v_rows integer;
+BEGIN
+    INSERT INTO usage_rollups AS r (
+      granularity, bucket_start, user_id, tool_id, model_id,
+      request_count, cache_hit_count, prompt_tokens, completion_tokens, total_tokens,
+      latency_sum_ms, latency_count, latency_hist
+    )
+    SELECT
+      g.granularity,
+      date_trunc(g.granularity, l.created_at AT TIME ZONE 'utc') AT TIME ZONE 'utc',
+      COALESCE(l.user_id, '00000000-0000-0000-0000-000000000000'),
+      COALESCE(l.tool_id, 'labour-audit'),
+      COALESCE(l.model_id, 'unknown'),
+      count(*),
+      0,
+      sum(COALESCE(l.prompt_tokens, 0)),
+      sum(COALESCE(l.completion_tokens, 0)),
+      sum(COALESCE(l.total_tokens, 0)),
+      sum(COALESCE(l.response_time_ms, 0)),
+      count(l.response_time_ms),
+      usage_hist_sum(usage_latency_hist(l.response_time_ms))
+    FROM api_logs l
+    CROSS JOIN (VALUES ('hour'), ('day')) AS g(granularity)
+    WHERE l.created_at >= v_from AND l.created_at < v_to
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (granularity, bucket_start, user_id, tool_id, model_id) DO UPDATE SET
+      request_count = EXCLUDED.request_count,
+      prompt_tokens = EXCLUDED.prompt_tokens,
+      completion_tokens = EXCLUDED.completion_tokens,
+      total_tokens = EXCLUDED.total_tokens,
+      latency_sum_ms = EXCLUDED.latency_sum_ms,
+      latency_count = EXCLUDED.latency_count,
+      latency_hist = EXCLUDED.latency_hist,
+      updated_at = now()
+    WHERE p_overwrite;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$;
+
+-- 6. Only the backend (service role) may write rollups
+REVOKE EXECUTE ON FUNCTION record_usage(timestamptz, uuid, text, text, integer, integer, integer, integer, integer, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_usage(timestamptz, uuid, text, text, integer, integer, integer, integer, integer, integer) TO service_role;
+REVOKE EXECUTE ON FUNCTION backfill_usage_rollups(timestamptz, timestamptz, boolean) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION backfill_usage_rollups(timestamptz, timestamptz, boolean) TO service_role;
+
+-- 7. Seed from the logs that exist today. The trigger above already holds a lock that
+-- blocks api_logs inserts until this migration commits, so nothing is counted twice or missed.
+SELECT backfill_usage_rollups();